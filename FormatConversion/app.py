@@ -1,11 +1,21 @@
 import streamlit as st
-from format_conversion import webp_to_jpg, mp4_to_gif, remove_background_batch
+from format_conversion import webp_to_jpg_batch, mp4_to_gif, remove_background_batch
 import io
-import os
 import zipfile
+from common.file_server import publish_file
+from common.scratch_space import maintain, create_job_dir, mark_done, release_job_dir
+
+# WEBP批量转换时在页面上预览的图片数量
+PREVIEW_LIMIT = 10
 
 st.title("格式转换工具")
 
+# 启动时清理上次运行遗留的临时目录，之后按间隔淘汰过期目录
+try:
+    maintain()
+except Exception as e:
+    st.warning(str(e))
+
 # 创建三个标签页
 tab1, tab2, tab3 = st.tabs(["WEBP转JPG", "MP4转GIF", "图片背景去除"])
 
@@ -16,34 +26,37 @@ with tab1:
     if webp_files:
         try:
             if st.button("转换所有图片"):
-                # 创建用于保存所有转换后图片的ZIP文件
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w") as zip_file:
-                    # 转换每张图片
-                    for i, webp_file in enumerate(webp_files):
-                        # 显示原始图片
-                        st.image(webp_file, caption=f"原始WEBP图片 {i+1}", width=300)
-                        
-                        # 转换图片
-                        jpg_image = webp_to_jpg(webp_file)
-                        
-                        # 将PIL图片转换为bytes
-                        buf = io.BytesIO()
-                        jpg_image.save(buf, format='JPEG')
-                        
-                        # 显示转换后的图片
-                        st.image(buf, caption=f"转换后的JPG图片 {i+1}", width=300)
-                        
-                        # 添加到ZIP文件
-                        zip_file.writestr(f"converted_{i+1}.jpg", buf.getvalue())
+                progress = st.progress(0.0, text="正在转换...")
+                
+                def show_converted(i, jpg_bytes):
+                    # 只预览前几张，大批量转换时页面不会被图片撑满
+                    if i < PREVIEW_LIMIT:
+                        col1, col2 = st.columns(2)
+                        col1.image(webp_files[i], caption=f"原始WEBP图片 {i+1}", width=300)
+                        col2.image(jpg_bytes, caption=f"转换后的JPG图片 {i+1}", width=300)
+                    progress.progress((i + 1) / len(webp_files), text=f"已转换 {i+1}/{len(webp_files)}")
                 
-                # 提供ZIP下载按钮
-                st.download_button(
-                    label="下载所有JPG图片(ZIP)",
-                    data=zip_buffer.getvalue(),
-                    file_name="converted_images.zip",
-                    mime="application/zip"
-                )
+                # 多进程转换，结果直接写入临时目录中的ZIP文件
+                job_path = create_job_dir('webp-zip')
+                try:
+                    zip_path = webp_to_jpg_batch(webp_files, on_converted=show_converted,
+                                                 output=job_path / "converted_images.zip")
+                except Exception:
+                    release_job_dir(job_path)
+                    raise
+                # 目录保留给下载链接使用，之后按时间或容量被淘汰
+                mark_done(job_path)
+                if len(webp_files) > PREVIEW_LIMIT:
+                    st.caption(f"仅预览前 {PREVIEW_LIMIT} 张，全部图片已打包到ZIP中")
+                
+                # 发布到文件服务：浏览器直接从磁盘下载ZIP，不读入内存；链接过期后删除文件。
+                # 文件服务不可用时只提示配置，不退回 download_button，避免把整个ZIP读入内存
+                try:
+                    link = publish_file(zip_path, mime="application/zip", client_host=st.context.headers.get('Host'))
+                except Exception as e:
+                    st.warning(f"无法生成下载链接: {str(e)}")
+                else:
+                    st.link_button("下载所有JPG图片(ZIP)", link)
         except Exception as e:
             st.error(f"转换失败: {str(e)}")
 
@@ -67,34 +80,30 @@ with tab2:
             
             if st.button("转换为GIF"):
                 with st.spinner("正在转换中..."):
-                    # 转换视频
-                    gif_path = mp4_to_gif(
+                    # 直接从上传文件的缓冲区转换，GIF写入本次请求独立的内存缓冲区，不落地到公共路径
+                    gif_buffer = mp4_to_gif(
                         mp4_file,
                         start_time=start_time,
                         end_time=end_time,
-                        target_width=target_width
+                        target_width=target_width,
+                        output=io.BytesIO()
                     )
                     
                     # 显示转换后的GIF
-                    with open(gif_path, 'rb') as f:
-                        gif_bytes = f.read()
-                    st.image(gif_bytes, caption="转换后的GIF")
+                    st.image(gif_buffer, caption="转换后的GIF")
                     
                     # 显示文件大小
-                    file_size = len(gif_bytes) / (1024 * 1024)
+                    file_size = gif_buffer.getbuffer().nbytes / (1024 * 1024)
                     st.write(f"文件大小: {file_size:.2f} MB")
                     
                     # 提供下载按钮
                     st.download_button(
                         label="下载GIF",
-                        data=gif_bytes,
+                        data=gif_buffer,
                         file_name="converted.gif",
                         mime="image/gif"
                     )
                     
-                    # 清理临时文件
-                    os.remove(gif_path)
-                    
         except Exception as e:
             st.error(f"转换失败: {str(e)}")
 
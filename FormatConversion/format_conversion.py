@@ -1,10 +1,18 @@
-from PIL import Image
+from PIL import Image, GifImagePlugin
 import cv2
 import numpy as np
 import os
+import shutil
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from rembg import remove
 from io import BytesIO
 
+from common.scratch_space import create_job_dir, mark_done, release_job_dir
+
 def webp_to_jpg(webp_file):
     """
     将WEBP格式图片转换为JPG格式
@@ -29,26 +37,349 @@ def webp_to_jpg(webp_file):
     except Exception as e:
         raise Exception(f"转换过程中出错: {str(e)}")
 
-def mp4_to_gif(video_file, max_size_mb=8, start_time=0, end_time=None, target_width=None):
+# 批量转换时ZIP在内存中缓冲的上限(字节)，超出后转存到临时文件
+ZIP_SPOOL_LIMIT = 64 * 1024 * 1024
+
+# 每个工作进程最多排队的图片数：限制同时驻留在内存中的原图和结果
+BATCH_QUEUE_PER_WORKER = 2
+
+def _webp_to_jpg_bytes(webp_file, quality):
+    """在工作进程中解码WEBP并编码为JPG，返回JPG字节"""
+    if isinstance(webp_file, (bytes, bytearray)):
+        webp_file = BytesIO(webp_file)
+    buf = BytesIO()
+    webp_to_jpg(webp_file).save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+def _batch_input(webp_file):
+    """路径直接交给工作进程读取；文件对象读出字节后传递"""
+    if isinstance(webp_file, (str, os.PathLike)):
+        return str(webp_file)
+    if isinstance(webp_file, (bytes, bytearray, memoryview)):
+        return bytes(webp_file)
+    if hasattr(webp_file, 'getvalue'):
+        return webp_file.getvalue()
+    return webp_file.read()
+
+def webp_to_jpg_batch(webp_files, max_workers=None, quality=75, on_converted=None, output=None):
+    """
+    使用多进程批量将WEBP转换为JPG，结果逐张写入ZIP
+    
+    JPG已经是压缩数据，ZIP中直接存储不再压缩；未指定 output 时ZIP先缓冲在内存中，超过 ZIP_SPOOL_LIMIT 后转存到临时文件。
+    同时提交的图片数量有上限，内存占用不随图片数量增长
+    
+    Args:
+        webp_files: WEBP文件对象、bytes或路径的列表
+        max_workers: 工作进程数 (默认: CPU核数)
+        quality: JPG质量 (默认: 75)
+        on_converted: 每写入一张图片后调用 on_converted(序号, JPG字节)
+        output: ZIP的保存路径；为None时写入临时文件对象
+    Returns:
+        指定 output 时返回该路径；否则返回ZIP文件对象（已定位到开头），使用后应关闭
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    spool = open(output, 'wb') if output is not None else tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_LIMIT)
+    try:
+        with zipfile.ZipFile(spool, 'w', compression=zipfile.ZIP_STORED) as zip_file, \
+                ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            files = iter(enumerate(webp_files))
+            
+            def submit_next():
+                item = next(files, None)
+                if item is not None:
+                    pending.append((item[0], executor.submit(_webp_to_jpg_bytes, _batch_input(item[1]), quality)))
+            
+            for _ in range(max_workers * BATCH_QUEUE_PER_WORKER):
+                submit_next()
+            # 按提交顺序取结果，ZIP中的文件顺序与输入一致
+            while pending:
+                i, future = pending.popleft()
+                jpg_bytes = future.result()
+                submit_next()
+                zip_file.writestr(f"converted_{i+1}.jpg", jpg_bytes)
+                if on_converted is not None:
+                    on_converted(i, jpg_bytes)
+        if output is not None:
+            spool.close()
+            return output
+        spool.seek(0)
+        return spool
+    except Exception as e:
+        spool.close()
+        raise Exception(f"批量转换过程中出错: {str(e)}")
+
+# 解码后的帧超过该大小(字节)时改为保存到临时目录中的内存映射文件，避免长视频占满内存
+FRAME_STORE_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# 相邻两次取帧的间隔超过该秒数时直接跳转（定位到关键帧后解码到目标位置），不再逐帧 grab
+SEEK_GAP_SECONDS = 2.0
+
+def _decode_frames(video_path, start_time, end_time, sample_fps, size, store_path):
+    """
+    只解码一次所选片段，按时间每 1/sample_fps 秒取一帧并缩放，保存为紧凑的 uint8 RGB 数组
+    
+    跳过的帧只 grab 不 retrieve，省去像素格式转换和拷贝；间隔较长时直接跳转。
+    按每帧的实际时间戳取帧，可变帧率视频同样按时间均匀抽样
+    
+    Args:
+        video_path: 视频文件路径
+        start_time: 开始时间(秒)
+        end_time: 结束时间(秒)
+        sample_fps: 抽帧频率
+        size: (宽, 高)
+        store_path: 帧数据过大时使用的内存映射文件路径
+    Returns:
+        (frames, frame_times)：形状为 (帧数, 高, 宽, 3) 的数组和每帧的时间(秒)
+    """
+    width, height = size
+    step = 1 / sample_fps
+    capacity = int(np.ceil((end_time - start_time) * sample_fps)) + 1
+    shape = (capacity, height, width, 3)
+    if capacity * height * width * 3 > FRAME_STORE_MEMORY_LIMIT:
+        frames = np.lib.format.open_memmap(store_path, mode='w+', dtype=np.uint8, shape=shape)
+    else:
+        frames = np.empty(shape, dtype=np.uint8)
+    
+    cap = cv2.VideoCapture(video_path)
+    # 时间戳容差取半个源帧时长，避免因取整漏掉正好落在采样点上的帧
+    tolerance = 0.5 / (cap.get(cv2.CAP_PROP_FPS) or 30)
+    if start_time > 0:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start_time * 1000)
+    frame_times = []
+    next_time = start_time
+    position = start_time
+    while len(frame_times) < capacity:
+        if next_time - position > SEEK_GAP_SECONDS:
+            cap.set(cv2.CAP_PROP_POS_MSEC, (next_time - tolerance) * 1000)
+        if not cap.grab():
+            break
+        position = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if position >= end_time:
+            break
+        if position + tolerance < next_time:
+            continue
+        
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        # 先缩小再转换颜色，转换结果直接写入帧数组，不产生中间副本
+        frame = cv2.resize(frame, size)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frames[len(frame_times)])
+        frame_times.append(position)
+        while next_time <= position + tolerance:
+            next_time += step
+    
+    cap.release()
+    return frames[:len(frame_times)], np.array(frame_times)
+
+def _resample_frames(frame_times, target_fps):
+    """
+    按时间从已解码的帧中重新抽帧
+    
+    Returns:
+        与 target_fps 的时间点最接近的帧下标
+    """
+    times = frame_times
+    if len(times) == 1:
+        return np.zeros(1, dtype=int)
+    wanted = np.arange(times[0], times[-1] + 1e-9, 1 / target_fps)
+    indices = np.clip(np.searchsorted(times, wanted), 1, len(times) - 1)
+    # 在左右相邻的两帧中选时间更接近的一帧
+    indices -= wanted - times[indices - 1] < times[indices] - wanted
+    return np.unique(np.clip(indices, 0, len(times) - 1))
+
+# 全局调色板：抽样的帧数和像素步长；颜色查找表每个通道保留的位数；透明色下标
+PALETTE_SAMPLE_FRAMES = 16
+PALETTE_SAMPLE_STRIDE = 4
+PALETTE_LUT_BITS = 6
+TRANSPARENT_INDEX = 255
+
+def _frame_at(frames, i, size):
+    """从帧数组中取出一帧，尺寸不同时缩放"""
+    frame = frames[i]
+    if (frame.shape[1], frame.shape[0]) != size:
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return np.asarray(frame)
+
+def _build_palette(frames, indices, size):
+    """
+    从均匀抽取的若干帧中隔行隔列取样，生成所有帧共用的调色板，并预先计算颜色查找表
+    
+    Returns:
+        (palette, lut)：255 个颜色的 RGB 数组（最后一个下标留作透明色），
+        以及把每个通道截断到 PALETTE_LUT_BITS 位的颜色映射到最近调色板下标的查找表
+    """
+    picks = indices[np.unique(np.linspace(0, len(indices) - 1, PALETTE_SAMPLE_FRAMES).round().astype(int))]
+    sample = np.concatenate([
+        _frame_at(frames, i, size)[::PALETTE_SAMPLE_STRIDE, ::PALETTE_SAMPLE_STRIDE] for i in picks
+    ])
+    quantized = Image.fromarray(np.ascontiguousarray(sample)).quantize(colors=TRANSPARENT_INDEX)
+    palette = np.array(quantized.getpalette()[:TRANSPARENT_INDEX * 3], dtype=np.float32).reshape(-1, 3)
+    
+    # 查找表中每个格子取中心颜色，按 |c - p|^2 = |c|^2 - 2c·p + |p|^2 分块求最近的调色板颜色
+    shift = 8 - PALETTE_LUT_BITS
+    levels = (np.arange(1 << PALETTE_LUT_BITS, dtype=np.float32) * (1 << shift)) + (1 << shift) / 2
+    cells = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    palette_norm = (palette ** 2).sum(axis=1)
+    lut = np.empty(len(cells), dtype=np.uint8)
+    for start in range(0, len(cells), 16384):
+        chunk = cells[start:start + 16384]
+        lut[start:start + 16384] = np.argmin(palette_norm - 2 * chunk @ palette.T, axis=1)
+    
+    full_palette = np.zeros((256, 3), dtype=np.uint8)
+    full_palette[:len(palette)] = palette
+    return full_palette, lut
+
+def _map_to_palette(frame, lut):
+    """用查找表把 RGB 帧向量化映射为调色板下标"""
+    shift = 8 - PALETTE_LUT_BITS
+    codes = frame >> shift
+    codes = (codes[..., 0].astype(np.int32) << (2 * PALETTE_LUT_BITS)) \
+        | (codes[..., 1].astype(np.int32) << PALETTE_LUT_BITS) | codes[..., 2]
+    return lut[codes]
+
+def _bbox(mask):
+    """返回掩码中为 True 的区域 (left, top, right, bottom)，全为 False 时返回None"""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not rows.size:
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+def _save_gif(frames, indices, size, target_fps, output_path, transparency=False):
+    """
+    逐帧量化并写入GIF；output_path 也可以是文件对象
+    
+    所有帧共用一个全局调色板，用查找表向量化量化，不再逐帧生成调色板。
+    每帧只写入与上一帧相比发生变化的矩形区域，写完即丢弃，内存中只保留当前帧和上一帧。
+    transparency 为 True 时区域内未变化的像素写成透明色；画面局部静止、噪点较多的视频可能更小，
+    但运动画面中透明像素会打断 LZW 的重复模式，反而变大，因此默认关闭
+    """
+    duration = 1000 / target_fps
+    palette, lut = _build_palette(frames, indices, size)
+    params = {'duration': duration}
+    if transparency:
+        params.update(transparency=TRANSPARENT_INDEX, disposal=1)
+    
+    output = open(output_path, 'wb') if isinstance(output_path, (str, os.PathLike)) else output_path
+    try:
+        previous = None
+        for i in indices:
+            current = _map_to_palette(_frame_at(frames, i, size), lut)
+            
+            if previous is None:
+                image = Image.fromarray(current, 'P')
+                image.putpalette(palette.tobytes())
+                header, _ = GifImagePlugin.getheader(image, info={'loop': 0, 'duration': duration})
+                chunks = header + GifImagePlugin.getdata(image, duration=duration)
+            else:
+                unchanged = current == previous
+                # 画面没有变化时写入一个像素，保持帧的时长不变
+                left, top, right, bottom = _bbox(~unchanged) or (0, 0, 1, 1)
+                region = current[top:bottom, left:right]
+                if transparency:
+                    region = np.where(unchanged[top:bottom, left:right], TRANSPARENT_INDEX, region).astype(np.uint8)
+                chunks = GifImagePlugin.getdata(Image.fromarray(np.ascontiguousarray(region), 'P'),
+                                                offset=(left, top), **params)
+            for chunk in chunks:
+                output.write(chunk)
+            previous = current
+        
+        output.write(b';')
+    finally:
+        if output is not output_path:
+            output.close()
+
+# GIF大小控制：抽样编码的帧数、预测时预留的余量、最多完整编码次数，以及帧率和缩放的下限；
+# 缩放下限相对于请求的尺寸（target_width），源视频远大于目标宽度时不会因此报错
+SIZE_SAMPLE_FRAMES = 8
+SIZE_SAFETY_MARGIN = 0.92
+MAX_FULL_ENCODES = 2
+MIN_GIF_FPS = 5
+MIN_GIF_SCALE = 0.3
+
+def _estimate_bytes_per_pixel(frames, indices, size, target_fps, transparency=False):
+    """
+    抽样编码少量帧，估算每帧每像素的字节数
+    
+    抽取均匀分布的几组相邻帧，使估算同时反映画面内容和帧间差分的效果
+    """
+    pairs = max(1, min(len(indices), SIZE_SAMPLE_FRAMES) // 2)
+    starts = np.linspace(0, max(len(indices) - 2, 0), pairs).round().astype(int)
+    sample = np.unique(np.concatenate([starts, np.minimum(starts + 1, len(indices) - 1)]))
+    buffer = BytesIO()
+    _save_gif(frames, indices[sample], size, target_fps, buffer, transparency)
+    return buffer.tell() / (len(sample) * size[0] * size[1])
+
+def _plan_gif(bytes_per_pixel, budget, frame_count, max_fps, max_scale, original_size):
+    """
+    根据大小模型选择参数：先在不低于 MIN_GIF_FPS 的范围内降低帧率，仍然放不下时再按面积比例缩小尺寸
+    
+    Args:
+        bytes_per_pixel: 每帧每像素的字节数
+        budget: 目标大小(字节)
+        frame_count: frame_count(fps) 返回该帧率下的帧数
+        max_fps: 最高帧率
+        max_scale: 最大缩放比例（相对原始尺寸）
+        original_size: 原始 (宽, 高)
+    Returns:
+        (帧率, 缩放比例)
+    """
+    pixels = original_size[0] * original_size[1]
+    min_fps = min(max_fps, MIN_GIF_FPS)
+    for target_fps in range(max_fps, min_fps - 1, -1):
+        if bytes_per_pixel * pixels * max_scale ** 2 * frame_count(target_fps) <= budget:
+            return target_fps, max_scale
+    scale = np.sqrt(budget / (bytes_per_pixel * pixels * frame_count(min_fps)))
+    return min_fps, min(max_scale, float(scale))
+
+def _video_path(video_file, job_path):
+    """
+    返回可供 OpenCV 打开的视频路径
+    
+    路径直接使用；bytes 和 BytesIO（包括 Streamlit 的上传文件）通过内存视图写入临时文件，
+    不会在内存中再复制一份；其他文件对象分块写入
+    """
+    if isinstance(video_file, (str, os.PathLike)):
+        return str(video_file)
+    
+    temp_video = str(job_path / "video.mp4")
+    with open(temp_video, 'wb') as f:
+        if isinstance(video_file, (bytes, bytearray, memoryview)):
+            f.write(video_file)
+        elif hasattr(video_file, 'getbuffer'):
+            with video_file.getbuffer() as data:
+                f.write(data)
+        else:
+            shutil.copyfileobj(video_file, f, 1024 * 1024)
+    return temp_video
+
+def mp4_to_gif(video_file, max_size_mb=8, start_time=0, end_time=None, target_width=None, transparency=False,
+               output=None):
     """
     将MP4视频转换为GIF格式
     
+    每次转换使用独立的临时目录和缓冲区，同一进程中可以并发转换
+    
     Args:
-        video_file: MP4文件对象
+        video_file: MP4文件路径、bytes 或文件对象
         max_size_mb: 最大文件大小(MB)
         start_time: 开始时间(秒)
         end_time: 结束时间(秒)，None表示到视频结尾
         target_width: 目标宽度(像素)，None表示保持原始宽度
+        transparency: 是否把帧间未变化的像素写成透明色
+        output: 可写的文件对象（如 BytesIO），None表示写入临时文件
+    Returns:
+        传入 output 时返回写好GIF并定位到开头的 output，临时文件全部删除；
+        否则返回GIF文件路径，使用完毕后由调用方通过 release_job_dir 删除所在目录
     """
+    job_path = create_job_dir('gif')
     try:
-        temp_output = "temp_output.gif"
-        temp_video = "temp_video.mp4"
+        temp_output = str(job_path / "output.gif") if output is None else output
+        temp_video = _video_path(video_file, job_path)
         
-        with open(temp_video, 'wb') as f:
-            f.write(video_file.read())
-            
         cap = cv2.VideoCapture(temp_video)
-        frames = []
         
         # 获取视频信息
         fps = int(cap.get(cv2.CAP_PROP_FPS))
@@ -56,6 +387,7 @@ def mp4_to_gif(video_file, max_size_mb=8, start_time=0, end_time=None, target_wi
         original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         video_duration = total_frames / fps
+        cap.release()
         
         # 验证和调整时间范围
         if end_time is None or end_time > video_duration:
@@ -74,87 +406,65 @@ def mp4_to_gif(video_file, max_size_mb=8, start_time=0, end_time=None, target_wi
             
         # 调整参数以控制文件大小
         target_fps = min(10, fps)  # 初始fps
-        frame_interval = max(1, fps // target_fps)
         
-        # 设置起始帧
-        start_frame = int(start_time * fps)
-        end_frame = int(end_time * fps)
-        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        # 所选片段只解码一次；之后的每次调整只从帧数组中重新抽帧和缩放
+        frames, frame_times = _decode_frames(
+            temp_video, start_time, end_time, target_fps,
+            (target_width, target_height), str(job_path / "frames.npy")
+        )
+        if Path(temp_video).parent == job_path:
+            os.remove(temp_video)
+        if not len(frames):
+            raise Exception("未能从所选片段读取到视频帧")
         
-        frame_count = start_frame
-        while frame_count < end_frame:
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            if frame_count % frame_interval == 0:
-                # 调整图片大小
-                frame = cv2.resize(frame, (target_width, target_height))
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                frames.append(Image.fromarray(frame_rgb))
+        # 保存GIF并控制文件大小：先抽样估算大小，预测能放下的帧率和尺寸，
+        # 通常一次完整编码即可；超出时用实际大小校准后再编码，最多 MAX_FULL_ENCODES 次
+        budget = max_size_mb * 1024 * 1024
+        max_fps = target_fps
+        original_size = (original_width, original_height)
+        frame_count = lambda f: len(_resample_frames(frame_times, f))
+        bytes_per_pixel = _estimate_bytes_per_pixel(
+            frames, np.arange(len(frames)), (target_width, target_height), target_fps, transparency
+        )
+        
+        requested_scale = scale
+        for _ in range(MAX_FULL_ENCODES):
+            target_fps, planned_scale = _plan_gif(
+                bytes_per_pixel, budget * SIZE_SAFETY_MARGIN, frame_count, max_fps, scale, original_size
+            )
+            # 只有需要把请求的尺寸缩小到 MIN_GIF_SCALE 以下时才放弃
+            if planned_scale < MIN_GIF_SCALE * requested_scale:
+                raise Exception(f"无法将文件压缩至{max_size_mb}MB以内，请尝试缩短视频时长或手动降低分辨率")
             
-            frame_count += 1
+            size = (max(1, int(original_width * planned_scale)), max(1, int(original_height * planned_scale)))
+            indices = _resample_frames(frame_times, target_fps)
+            if output is None:
+                _save_gif(frames, indices, size, target_fps, temp_output, transparency)
+                actual = os.path.getsize(temp_output)
+            else:
+                output.seek(0)
+                output.truncate()
+                _save_gif(frames, indices, size, target_fps, output, transparency)
+                actual = output.tell()
+            if actual <= budget:
+                break
             
-        cap.release()
+            # 用实际结果校准模型；尺寸越小每像素字节数越高，下一次预测会更保守
+            bytes_per_pixel = actual / (len(indices) * size[0] * size[1])
+            max_fps, scale = target_fps, planned_scale
+        else:
+            raise Exception(f"无法将文件压缩至{max_size_mb}MB以内，请尝试缩短视频时长或手动降低分辨率")
         
-        # 保存GIF并控制文件大小
-        if frames:
-            while True:
-                frames[0].save(
-                    temp_output,
-                    save_all=True,
-                    append_images=frames[1:],
-                    duration=1000/target_fps,
-                    loop=0,
-                    optimize=True  # 启用优化
-                )
-                
-                size_mb = os.path.getsize(temp_output) / (1024 * 1024)
-                if size_mb <= max_size_mb:
-                    break
-                    
-                # 如果文件过大，采取措施减小大小
-                if target_fps > 5:
-                    # 首先降低帧率
-                    target_fps -= 2
-                    frame_interval = max(1, fps // target_fps)
-                else:
-                    # 然后缩小尺寸
-                    scale *= 0.8
-                    target_width = int(original_width * scale)
-                    target_height = int(original_height * scale)
-                    
-                # 重新生成帧
-                frames = []
-                cap = cv2.VideoCapture(temp_video)
-                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-                frame_count = start_frame
-                
-                while frame_count < end_frame:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                        
-                    if frame_count % frame_interval == 0:
-                        frame = cv2.resize(frame, (target_width, target_height))
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        frames.append(Image.fromarray(frame_rgb))
-                    
-                    frame_count += 1
-                
-                cap.release()
-                
-                if scale < 0.3 and target_fps <= 5:
-                    raise Exception("无法将文件压缩至8MB以内，请尝试缩短视频时长或手动降低分辨率")
-
-        os.remove(temp_video)
+        del frames
+        if output is not None:
+            release_job_dir(job_path)
+            output.seek(0)
+            return output
+        mark_done(job_path)
         return temp_output
         
     except Exception as e:
-        if os.path.exists(temp_video):
-            os.remove(temp_video)
-        if os.path.exists(temp_output):
-            os.remove(temp_output)
+        release_job_dir(job_path)
         raise Exception(f"转换过程中出错: {str(e)}")
 
 def remove_background_batch(image_files):
@@ -0,0 +1,29 @@
+import cv2
+import numpy as np
+import pytest
+from io import BytesIO
+from PIL import Image
+
+# format_conversion 在模块级导入 rembg
+pytest.importorskip('rembg')
+from format_conversion import mp4_to_gif
+
+def _write_video(path, size, seconds=2, fps=30):
+    """生成带移动方块的测试视频"""
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    background = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None].repeat(height, 0).repeat(3, 2)
+    for i in range(seconds * fps):
+        frame = background.copy()
+        x = i * (width - 200) // (seconds * fps)
+        frame[height // 3:height // 3 + 200, x:x + 200] = (0, 0, 255)
+        writer.write(frame)
+    writer.release()
+
+def test_large_source_small_target_width(tmp_path):
+    # 1920 宽的视频缩到 480 宽(缩放 0.25)，低于 MIN_GIF_SCALE 的绝对值，但完全放得下
+    video = tmp_path / 'large.mp4'
+    _write_video(video, (1920, 1080))
+    gif = mp4_to_gif(str(video), target_width=480, output=BytesIO())
+    assert gif.getbuffer().nbytes <= 8 * 1024 * 1024
+    assert Image.open(gif).size == (480, 270)
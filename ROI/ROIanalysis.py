@@ -4,31 +4,40 @@ from mpl_toolkits.mplot3d import Axes3D
 import seaborn as sns
 from ROIfunction import calculate_commission
 import plotly.graph_objects as go
+from ROIoptimizer import find_optimal_commission, calculate_tier_gains, total_income
+from ROIsurface import get_commission_tensor, get_target_surface
 # from ROI_new import calculate_commission
 
-def find_optimal_path(current_gmv, current_roi, ROI, GMV, Z):
+# 分析图覆盖的 ROI 和 GMV 范围
+ROI_RANGE = (1.0, 3.5)
+GMV_RANGE = (0.5, 60.0)
+# 目标GMV轴与 app.py 中目标值输入框的范围和步长一致，滑动时直接取预计算切片
+TARGET_RANGE = (0.0, 100.0)
+TARGET_STEP = 1.0
+
+def get_analysis_tensor():
+    """获取分析图使用的 (目标GMV, GMV, ROI) 预计算张量，首次调用后全局共享"""
+    return get_commission_tensor(
+        roi_min=ROI_RANGE[0], roi_max=ROI_RANGE[1],
+        gmv_min=GMV_RANGE[0], gmv_max=GMV_RANGE[1],
+        target_min=TARGET_RANGE[0], target_max=TARGET_RANGE[1], target_step=TARGET_STEP,
+        resolution=20
+    )
+
+def find_optimal_path(current_gmv, current_roi, ROI, GMV, target_gmv=0):
     """
-    找到从当前位置到最优点的路径，并计算每个阶段的优化方向
+    找到从当前位置到最优点的路径，并计算每个阶段的优化方向（包含任务量奖励）
     """
-    # 找到当前位置最接近的网格点
-    current_idx = (
-        np.abs(GMV[:,0] - current_gmv).argmin(),
-        np.abs(ROI[0,:] - current_roi).argmin()
-    )
-    
-    # 找到最优点
-    max_idx = np.unravel_index(Z.argmax(), Z.shape)
+    # 在网格覆盖的范围内求精确最优点
+    optimum = find_optimal_commission(GMV.min(), GMV.max(), ROI.min(), ROI.max(), target_gmv)
     
     # 生成路径点
     steps = 5  # 减少步数以便更清晰地显示每个阶段
-    path_gmv = np.linspace(GMV[current_idx[0], current_idx[1]], GMV[max_idx[0], max_idx[1]], steps)
-    path_roi = np.linspace(ROI[current_idx[0], current_idx[1]], ROI[max_idx[0], max_idx[1]], steps)
+    path_gmv = np.linspace(current_gmv, optimum['gmv'], steps)
+    path_roi = np.linspace(current_roi, optimum['roi'], steps)
     
     # 计算路径上的提成金额
-    path_z = np.zeros(steps)
-    for i in range(steps):
-        _, commission_cny, bonus = calculate_commission(float(path_gmv[i]), float(path_roi[i]))
-        path_z[i] = commission_cny + bonus  # 将提成和奖励合并
+    path_z = total_income(path_gmv, path_roi, target_gmv)  # 将提成和奖励合并
     
     # 计算每个阶段的优化方向
     directions = []
@@ -36,9 +45,9 @@ def find_optimal_path(current_gmv, current_roi, ROI, GMV, Z):
         delta_gmv = path_gmv[i+1] - path_gmv[i]
         delta_roi = path_roi[i+1] - path_roi[i]
         
-        # 计算当前点周围的梯度
-        gmv_grad = calculate_gradient_gmv(path_gmv[i], path_roi[i])
-        roi_grad = calculate_gradient_roi(path_gmv[i], path_roi[i])
+        # 计算当前点跨越下一档位的边际收益
+        gmv_grad = calculate_gradient_gmv(path_gmv[i], path_roi[i], target_gmv)
+        roi_grad = calculate_gradient_roi(path_gmv[i], path_roi[i], target_gmv)
         
         # 根据梯度决定优化方向
         if abs(gmv_grad) > abs(roi_grad):
@@ -46,19 +55,22 @@ def find_optimal_path(current_gmv, current_roi, ROI, GMV, Z):
         else:
             directions.append(('ROI', delta_gmv, delta_roi))
     
-    return path_gmv, path_roi, path_z, directions
+    return path_gmv, path_roi, path_z, directions, optimum
 
-def calculate_gradient_gmv(gmv, roi, delta=0.1):
-    """计算GMV方向的梯度"""
-    _, commission1, bonus1 = calculate_commission(gmv, roi)
-    _, commission2, bonus2 = calculate_commission(gmv + delta, roi)
-    return ((commission2 + bonus2) - (commission1 + bonus1)) / delta
+def calculate_gradient_gmv(gmv, roi, target_gmv=0):
+    """计算GMV方向的梯度：跨入下一档位的收益按当前档位宽度平均，已到顶则为档内斜率"""
+    gains = calculate_tier_gains(gmv, roi, target_gmv)
+    step = gains['next_gmv_tier']
+    if step is None:
+        return gains['gmv_slope']
+    return step['gain'] / step['span']
 
-def calculate_gradient_roi(gmv, roi, delta=0.1):
-    """计算ROI方向的梯度"""
-    _, commission1, bonus1 = calculate_commission(gmv, roi)
-    _, commission2, bonus2 = calculate_commission(gmv, roi + delta)
-    return ((commission2 + bonus2) - (commission1 + bonus1)) / delta
+def calculate_gradient_roi(gmv, roi, target_gmv=0):
+    """计算ROI方向的梯度：跨入下一档位的收益按当前档位宽度平均，已到顶则为0"""
+    step = calculate_tier_gains(gmv, roi, target_gmv)['next_roi_tier']
+    if step is None:
+        return 0.0
+    return step['gain'] / step['span']
 
 def plot_optimization_arrow(ax, pos_gmv, pos_roi, pos_z, direction, scale=2):
     """Draw optimization direction arrow"""
@@ -83,21 +95,10 @@ def plot_optimization_arrow(ax, pos_gmv, pos_roi, pos_z, direction, scale=2):
     
     return label
 
-def create_3d_analysis(current_gmv=None, current_roi=None):
+def create_3d_analysis(current_gmv=None, current_roi=None, target_gmv=0):
     """Create interactive 3D analysis plot"""
-    # Create ROI and GMV value ranges
-    roi_range = np.linspace(1.0, 3.5, 50)
-    gmv_range = np.linspace(0.5, 60, 50)
-    
-    # 创建网格
-    ROI, GMV = np.meshgrid(roi_range, gmv_range)
-    
-    # 计算提成金额（人民币）
-    Z = np.zeros_like(ROI)
-    for i in range(len(gmv_range)):
-        for j in range(len(roi_range)):
-            _, cny_amount, bonus = calculate_commission(float(GMV[i,j]), float(ROI[i,j]))
-            Z[i,j] = cny_amount + bonus  # 将提成和奖励合并
+    # 从预计算张量中取出当前目标GMV下的提成曲面（人民币，提成与奖励合并）
+    ROI, GMV, Z = get_target_surface(get_analysis_tensor(), target_gmv)
     
     # 创建3D图表
     fig = plt.figure(figsize=(12, 8))
@@ -109,14 +110,14 @@ def create_3d_analysis(current_gmv=None, current_roi=None):
     # 如果提供了当前位置，计算并显示优化路径
     if current_gmv is not None and current_roi is not None:
         # 计算当前提成
-        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi)
+        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi, target_gmv)
         current_total = current_commission + current_bonus
         
         # 找到优化路径和方向
-        path_gmv, path_roi, path_z, directions = find_optimal_path(current_gmv, current_roi, ROI, GMV, Z)
+        path_gmv, path_roi, path_z, directions, optimum = find_optimal_path(current_gmv, current_roi, ROI, GMV, target_gmv)
         
         # 绘制当前点
-        ax.scatter([current_roi], [current_gmv], [current_commission], 
+        ax.scatter([current_roi], [current_gmv], [current_total], 
                   color='red', s=100, label='Current Position')
         
         # 绘制优化路径
@@ -143,8 +144,7 @@ def create_3d_analysis(current_gmv=None, current_roi=None):
                                  directions[i])
         
         # 绘制最优点
-        max_commission_idx = np.unravel_index(Z.argmax(), Z.shape)
-        ax.scatter([ROI[max_commission_idx]], [GMV[max_commission_idx]], [Z[max_commission_idx]], 
+        ax.scatter([optimum['roi']], [optimum['gmv']], [optimum['total']], 
                   color='green', s=100)
     
     ax.set_xlabel('ROI Value')
@@ -160,13 +160,12 @@ def create_3d_analysis(current_gmv=None, current_roi=None):
     fig.colorbar(surf, ax=ax, label='Commission Amount (10k CNY)')
     
     plt.tight_layout()
-    plt.show()
     
     # 计算并打印分析结果
-    max_commission_idx = np.unravel_index(Z.argmax(), Z.shape)
-    optimal_gmv = GMV[max_commission_idx]
-    optimal_roi = ROI[max_commission_idx]
-    max_commission = Z[max_commission_idx]
+    optimum = find_optimal_commission(GMV_RANGE[0], GMV_RANGE[1], ROI_RANGE[0], ROI_RANGE[1], target_gmv)
+    optimal_gmv = optimum['gmv']
+    optimal_roi = optimum['roi']
+    max_commission = optimum['total']
     
     print(f"\nOptimal Parameters Analysis:")
     print(f"Maximum Commission: {max_commission:.2f} 10k CNY")
@@ -174,34 +173,115 @@ def create_3d_analysis(current_gmv=None, current_roi=None):
     print(f"Corresponding ROI: {optimal_roi:.2f}")
     
     if current_gmv is not None and current_roi is not None:
-        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi)
+        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi, target_gmv)
         current_total = current_commission + current_bonus
         print(f"\nCurrent Status:")
         print(f"Current Commission: {current_commission:.2f} 10k CNY")
         print(f"Current Task Bonus: {current_bonus:.2f} 10k CNY")
         print(f"Current Total Income: {current_total:.2f} 10k CNY")
+    
+    return fig
 
-def analyze_commission(current_gmv=None, current_roi=None):
+def downsample_surface(ROI, GMV, Z, max_points=2500, decimals=4):
+    """
+    在服务端对曲面降采样并压缩精度，减小发送给浏览器的数据量
+    
+    Parameters:
+        ROI, GMV, Z: 2D arrays from get_target_surface
+        max_points: int, maximum number of surface points to send
+        decimals: int, decimals kept for coordinates and values
+        
+    Returns:
+        tuple: (roi_axis, gmv_axis, Z) with 1D axes and the downsampled Z
+    """
+    rows, cols = Z.shape
+    stride = max(1, int(np.ceil(np.sqrt(rows * cols / max_points))))
+    # 等间隔抽取行列，并始终保留最后一行/列以覆盖完整范围
+    row_idx = np.unique(np.append(np.arange(0, rows, stride), rows - 1))
+    col_idx = np.unique(np.append(np.arange(0, cols, stride), cols - 1))
+    
+    roi_axis = np.round(ROI[0, col_idx], decimals)
+    gmv_axis = np.round(GMV[row_idx, 0], decimals)
+    return roi_axis, gmv_axis, np.round(Z[np.ix_(row_idx, col_idx)], decimals)
+
+def create_plotly_analysis(current_gmv=None, current_roi=None, target_gmv=0, max_points=2500):
+    """Create interactive 3D analysis plot rendered client-side with WebGL"""
+    ROI, GMV, Z = get_target_surface(get_analysis_tensor(), target_gmv)
+    roi_axis, gmv_axis, z_values = downsample_surface(ROI, GMV, Z, max_points)
+    
+    fig = go.Figure(go.Surface(
+        x=roi_axis, y=gmv_axis, z=z_values,
+        colorscale='Viridis', opacity=0.8,
+        colorbar=dict(title='Commission Amount (10k CNY)'),
+        hovertemplate='ROI: %{x:.2f}<br>GMV: %{y:.2f}<br>Commission: %{z:.2f}<extra></extra>'
+    ))
+    
+    if current_gmv is not None and current_roi is not None:
+        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi, target_gmv)
+        path_gmv, path_roi, path_z, directions, optimum = find_optimal_path(current_gmv, current_roi, ROI, GMV, target_gmv)
+        
+        # 优化路径，每个阶段的起点按优先方向着色
+        fig.add_trace(go.Scatter3d(
+            x=path_roi, y=path_gmv, z=path_z, mode='lines',
+            line=dict(color='gray', dash='dash'), name='Optimization Path'
+        ))
+        for priority, color in (('GMV', 'black'), ('ROI', 'blue')):
+            stage_idx = [i for i, direction in enumerate(directions) if direction[0] == priority]
+            fig.add_trace(go.Scatter3d(
+                x=path_roi[stage_idx], y=path_gmv[stage_idx], z=path_z[stage_idx],
+                mode='markers', marker=dict(color=color, symbol='diamond', size=5),
+                name=f'{priority} Priority'
+            ))
+        
+        fig.add_trace(go.Scatter3d(
+            x=[current_roi], y=[current_gmv], z=[current_commission + current_bonus],
+            mode='markers', marker=dict(color='red', size=8), name='Current Position'
+        ))
+        fig.add_trace(go.Scatter3d(
+            x=[optimum['roi']], y=[optimum['gmv']], z=[optimum['total']],
+            mode='markers', marker=dict(color='green', size=8), name='Optimal Position'
+        ))
+    
+    fig.update_layout(
+        title='Commission Amount vs ROI & GMV (3D View)',
+        scene=dict(
+            xaxis_title='ROI Value',
+            yaxis_title='GMV (10k USD)',
+            zaxis_title='Commission Amount (10k CNY)'
+        ),
+        legend=dict(x=0, y=1),
+        margin=dict(l=0, r=0, t=40, b=0),
+        height=650
+    )
+    return fig
+
+def analyze_commission(current_gmv=None, current_roi=None, renderer='matplotlib', target_gmv=0):
     """
     Analyze and return visualization results and data analysis
     
     Parameters:
         current_gmv: float, current GMV value (10k USD)
         current_roi: float, current ROI value
+        renderer: str, 'matplotlib' for a static figure or 'plotly' for an interactive WebGL figure
+        target_gmv: float, monthly GMV target (10k USD), 0 means no target
         
     Returns:
         dict: Dictionary containing chart objects and analysis results
     """
     # 创建3D分析图
-    fig = create_3d_analysis(current_gmv, current_roi)
+    if renderer == 'plotly':
+        fig = create_plotly_analysis(current_gmv, current_roi, target_gmv)
+    else:
+        fig = create_3d_analysis(current_gmv, current_roi, target_gmv)
     
     # 准备分析结果
     results = {}
     if current_gmv is not None and current_roi is not None:
-        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi)
+        _, current_commission, current_bonus = calculate_commission(current_gmv, current_roi, target_gmv)
         current_total = current_commission + current_bonus
         results = {
             'current_commission': current_commission,
+            'current_bonus': current_bonus,
             'current_gmv': current_gmv,
             'current_roi': current_roi
         }
@@ -226,3 +306,4 @@ def analyze_commission(current_gmv=None, current_roi=None):
 if __name__ == "__main__":
     # 示例：分析当前位置 GMV=20, ROI=2.0 的优化路径
     analyze_commission(current_gmv=21.4, current_roi=2.07)
+    plt.show()
@@ -0,0 +1,165 @@
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from ROIfunction import calculate_commission_vectorized, STEP_MODEL
+from ROIrules import get_model
+
+OUTPUT_COLUMNS = ['commission_usd', 'commission_cny', 'task_bonus', 'total_income', 'error']
+
+def iter_chunks(input_path, chunksize=50000):
+    """
+    分块读取销售数据，内存占用只与 chunksize 有关
+
+    参数:
+        input_path: str | Path - CSV 或 XLSX 文件路径
+        chunksize: int - 每块行数
+
+    返回:
+        Iterator[pd.DataFrame]: 数据块
+    """
+    input_path = Path(input_path)
+    if input_path.suffix.lower() == '.csv':
+        yield from pd.read_csv(input_path, chunksize=chunksize)
+        return
+
+    if input_path.suffix.lower() not in ('.xlsx', '.xlsm'):
+        raise ValueError(f"不支持的文件格式: {input_path.suffix}，仅支持 CSV 和 XLSX")
+
+    # pandas 读取 Excel 不支持分块，使用 openpyxl 只读模式逐行读取
+    from openpyxl import load_workbook
+    workbook = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=header)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=header)
+    finally:
+        workbook.close()
+
+def _numeric_column(chunk, col):
+    """把一列转换为浮点数组，空白和无法解析的值变为 NaN，同时返回这些值中原本非空的掩码"""
+    values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=float)
+    return values, np.isnan(values) & chunk[col].notna().to_numpy()
+
+def calculate_chunk(chunk, evaluate=calculate_commission_vectorized,
+                    gmv_col='gmv', roi_col='roi', target_col='target_gmv'):
+    """
+    为一个数据块追加提成结果列
+
+    GMV 或 ROI 为空、不是数值或为无穷大的行不计算提成：结果列为空，error 列写明原因；
+    目标GMV为空时按未设置目标处理，填写了但不是数值时同样记为错误
+
+    参数:
+        chunk: pd.DataFrame - 包含 GMV、ROI（以及可选的目标GMV）列的数据块
+        evaluate: callable - 向量化提成函数，返回 (美元提成, 人民币提成, 任务量奖励)
+        gmv_col, roi_col, target_col: str - 列名，缺少目标GMV列时按未设置目标处理
+
+    返回:
+        pd.DataFrame: 追加了 commission_usd/commission_cny/task_bonus/total_income/error 的数据块
+    """
+    missing = [col for col in (gmv_col, roi_col) if col not in chunk]
+    if missing:
+        raise ValueError(f"输入数据缺少必需的列: {', '.join(missing)}")
+
+    gmv, _ = _numeric_column(chunk, gmv_col)
+    roi, _ = _numeric_column(chunk, roi_col)
+    checks = [(gmv_col, ~np.isfinite(gmv)), (roi_col, ~np.isfinite(roi))]
+    if target_col in chunk:
+        target_gmv, bad_target = _numeric_column(chunk, target_col)
+        target_gmv = np.nan_to_num(target_gmv)
+        checks.append((target_col, bad_target))
+    else:
+        target_gmv = 0.0
+
+    usd, cny, bonus = evaluate(gmv, roi, target_gmv)
+
+    # 只有存在无效行时才逐行生成错误信息，正常数据块不产生额外的字符串开销
+    invalid = np.logical_or.reduce([bad for _, bad in checks])
+    error = ''
+    if invalid.any():
+        error = np.full(len(chunk), '', dtype=object)
+        for col, bad in checks:
+            error[bad] += f"{col} 为空或不是有效数值; "
+        error[invalid] = [message.rstrip('; ') for message in error[invalid]]
+        usd, cny, bonus = (np.where(invalid, np.nan, values) for values in (usd, cny, bonus))
+    return chunk.assign(
+        commission_usd=usd,
+        commission_cny=cny,
+        task_bonus=bonus,
+        total_income=cny + bonus,
+        error=error
+    )
+
+def run_batch(input_path, output_path, chunksize=50000, model_name=STEP_MODEL,
+              gmv_col='gmv', roi_col='roi', target_col='target_gmv', progress=None):
+    """
+    批量计算整个团队的提成，结果以 CSV 流式写出
+
+    参数:
+        input_path: str | Path - 输入 CSV/XLSX 文件
+        output_path: str | Path - 输出 CSV 文件
+        chunksize: int - 每块行数
+        model_name: str - commission_rules.json 中的模型名称 (默认: step)
+        gmv_col, roi_col, target_col: str - 输入列名
+        progress: callable - 每处理完一块调用 progress(已处理行数, 已用秒数)
+
+    返回:
+        dict: rows、invalid_rows（数据无效、结果为空的行数）、seconds、rows_per_second
+    """
+    evaluate = get_model(model_name).evaluate
+
+    start = time.perf_counter()
+    rows = 0
+    invalid_rows = 0
+    with open(output_path, 'w', encoding='utf-8-sig', newline='') as output:
+        for i, chunk in enumerate(iter_chunks(input_path, chunksize)):
+            result = calculate_chunk(chunk, evaluate, gmv_col, roi_col, target_col)
+            result.to_csv(output, header=(i == 0), index=False)
+            rows += len(result)
+            invalid_rows += int((result['error'] != '').sum())
+            if progress:
+                progress(rows, time.perf_counter() - start)
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'invalid_rows': invalid_rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else float('inf')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='批量计算销售提成（月末结算）')
+    parser.add_argument('input', help='输入 CSV/XLSX 文件，需包含 gmv、roi 列，可选 target_gmv 列')
+    parser.add_argument('-o', '--output', help='输出 CSV 文件，默认为 <输入文件名>_commission.csv')
+    parser.add_argument('--chunksize', type=int, default=50000, help='每块行数 (默认: 50000)')
+    parser.add_argument('--model', default=STEP_MODEL, help='commission_rules.json 中的模型名称 (默认: step)')
+    parser.add_argument('--gmv-col', default='gmv')
+    parser.add_argument('--roi-col', default='roi')
+    parser.add_argument('--target-col', default='target_gmv')
+    args = parser.parse_args()
+
+    output = args.output or str(Path(args.input).with_name(f"{Path(args.input).stem}_commission.csv"))
+
+    def report(rows, seconds):
+        print(f"已处理 {rows:,} 行，{rows / max(seconds, 1e-9):,.0f} 行/秒", flush=True)
+
+    stats = run_batch(args.input, output, args.chunksize, args.model,
+                      args.gmv_col, args.roi_col, args.target_col, progress=report)
+    print(f"完成：共 {stats['rows']:,} 行，用时 {stats['seconds']:.2f} 秒，"
+          f"{stats['rows_per_second']:,.0f} 行/秒，结果已写入 {output}")
+    if stats['invalid_rows']:
+        print(f"其中 {stats['invalid_rows']:,} 行数据无效，未计算提成，原因见 error 列")
+
+if __name__ == "__main__":
+    main()
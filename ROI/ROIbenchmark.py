@@ -0,0 +1,260 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import ROIfunction
+import ROI_new
+from ROIanalysis import analyze_commission, find_optimal_path
+from ROIbatch import calculate_chunk
+from ROIoptimizer import find_optimal_commission
+from ROIrules import get_model
+from ROIsimulation import simulate_commission
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+# 逐点调用的 Python 循环太慢，只在不超过该规模时运行
+SCALAR_MAX_SIZE = 10**5
+
+# 向量化路径的最低吞吐量(点/秒)，低于该值说明热点路径又退化成了 Python 循环
+MIN_VECTORIZED_THROUGHPUT = 1e6
+
+# 与输入规模无关的用例每次计时连续调用的次数
+CALLS_PER_RUN = 10
+
+def make_inputs(size, seed=0):
+    """生成覆盖全部档位的合成 (GMV, ROI, 目标GMV) 数据"""
+    rng = np.random.default_rng(seed)
+    gmv = rng.uniform(0.5, 80, size)
+    roi = rng.uniform(1.0, 3.5, size)
+    target_gmv = rng.uniform(0, 60, size)
+    return gmv, roi, target_gmv
+
+# 每个用例接收规模，完成数据准备后返回一个待计时的无参函数
+
+def bench_scalar_step(size):
+    gmv, roi, target_gmv = (x.tolist() for x in make_inputs(size))
+    def run():
+        for g, r, t in zip(gmv, roi, target_gmv):
+            ROIfunction.calculate_commission(g, r, t)
+    return run
+
+def bench_scalar_sigmoid(size):
+    gmv, roi, _ = (x.tolist() for x in make_inputs(size))
+    def run():
+        for g, r in zip(gmv, roi):
+            ROI_new.calculate_commission(g, r)
+    return run
+
+def bench_vectorized_step(size):
+    inputs = make_inputs(size)
+    return lambda: ROIfunction.calculate_commission_vectorized(*inputs)
+
+def bench_compiled_sigmoid(size):
+    inputs = make_inputs(size)
+    return lambda: get_model('sigmoid').evaluate(*inputs)
+
+def bench_batch_chunk(size):
+    gmv, roi, target_gmv = make_inputs(size)
+    chunk = pd.DataFrame({'gmv': gmv, 'roi': roi, 'target_gmv': target_gmv})
+    return lambda: calculate_chunk(chunk)
+
+def bench_simulation(size):
+    return lambda: simulate_commission(12, {'type': 'normal', 'mean': 8, 'std': 4},
+                                       {'type': 'normal', 'mean': 2.0, 'std': 0.2},
+                                       target_gmv=15, n_samples=size, workers=1, seed=0)
+
+# (用例名称, 函数, 是否为向量化路径, 最大规模)，按 点/秒 报告
+CASES = [
+    ('scalar_step', bench_scalar_step, False, SCALAR_MAX_SIZE),
+    ('scalar_sigmoid', bench_scalar_sigmoid, False, SCALAR_MAX_SIZE),
+    ('vectorized_step', bench_vectorized_step, True, None),
+    ('compiled_sigmoid', bench_compiled_sigmoid, True, None),
+    ('batch_chunk', bench_batch_chunk, True, None),
+    ('simulation', bench_simulation, True, None),
+]
+
+# 以下用例的工作量与输入规模无关，返回单次调用的无参函数，按 次/秒 报告
+
+def _analysis_call(renderer):
+    def run():
+        # create_3d_analysis 会打印分析结果，计时期间丢弃标准输出
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            figure = analyze_commission(21.4, 2.07, renderer=renderer, target_gmv=20)['figure']
+        if renderer == 'matplotlib':
+            plt.close(figure)
+    # 先调用一次建立预计算张量，计时的是页面每次重跑时的开销
+    run()
+    return run
+
+def bench_analysis_plotly():
+    return _analysis_call('plotly')
+
+def bench_analysis_matplotlib():
+    return _analysis_call('matplotlib')
+
+def bench_optimal_path():
+    ROI, GMV = np.meshgrid(np.linspace(1.0, 3.5, 20), np.linspace(0.5, 60, 20))
+    return lambda: find_optimal_path(21.4, 2.07, ROI, GMV, target_gmv=20)
+
+def bench_optimizer():
+    return lambda: find_optimal_commission(0.5, 60.0, 1.0, 3.5, target_gmv=20)
+
+CALL_CASES = [
+    ('analysis_plotly', bench_analysis_plotly),
+    ('analysis_matplotlib', bench_analysis_matplotlib),
+    ('optimal_path', bench_optimal_path),
+    ('optimizer', bench_optimizer),
+]
+
+def _best_time(run, repeat, calls=1):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            run()
+        timings.append(time.perf_counter() - start)
+    return min(timings) / calls
+
+def run_benchmarks(sizes=DEFAULT_SIZES, cases=None, repeat=3):
+    """
+    运行基准测试
+
+    参数:
+        sizes: list[int] - 合成数据规模（点数）
+        cases: list[str] - 只运行指定用例，None 表示全部
+        repeat: int - 每个用例重复次数，取最快的一次
+
+    返回:
+        list[dict]: 每个 (用例, 规模) 的 seconds 和 throughput；unit 为 points 时吞吐量为 点/秒，
+        为 calls 时 seconds 是单次调用耗时，吞吐量为 次/秒，size 为 None
+    """
+    results = []
+    for name, func, vectorized, max_size in CASES:
+        if cases and name not in cases:
+            continue
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+            seconds = _best_time(func(size), repeat)
+            results.append({
+                'case': name,
+                'size': size,
+                'unit': 'points',
+                'vectorized': vectorized,
+                'seconds': seconds,
+                'throughput': size / seconds if seconds > 0 else float('inf')
+            })
+            print(f"{name:<20} {size:>10,} 点  {seconds * 1000:>10.2f} ms  "
+                  f"{results[-1]['throughput']:>14,.0f} 点/秒", flush=True)
+
+    for name, func in CALL_CASES:
+        if cases and name not in cases:
+            continue
+        seconds = _best_time(func(), repeat, CALLS_PER_RUN)
+        results.append({
+            'case': name,
+            'size': None,
+            'unit': 'calls',
+            'vectorized': False,
+            'seconds': seconds,
+            'throughput': 1 / seconds if seconds > 0 else float('inf')
+        })
+        print(f"{name:<20} {'单次调用':>10}  {seconds * 1000:>10.2f} ms  "
+              f"{results[-1]['throughput']:>14,.1f} 次/秒", flush=True)
+    return results
+
+def _describe(result):
+    unit = '次/秒' if result.get('unit') == 'calls' else '点/秒'
+    label = result['case'] if result['size'] is None else f"{result['case']} @ {result['size']:,}"
+    return label, unit
+
+def check_regressions(results, baseline=None, max_regression=0.3,
+                      min_vectorized_throughput=MIN_VECTORIZED_THROUGHPUT):
+    """
+    检查性能回退
+
+    参数:
+        results: list[dict] - run_benchmarks 的结果
+        baseline: list[dict] - 之前保存的结果，按 (用例, 规模) 对比
+        max_regression: float - 允许的最大吞吐量下降比例（点/秒 或 次/秒，与基线同单位比较）
+        min_vectorized_throughput: float - 向量化路径在 10^5 点及以上时的最低吞吐量
+
+    返回:
+        list[str]: 失败原因，空列表表示通过
+    """
+    failures = []
+    baseline_map = {(r['case'], r['size']): r for r in baseline or []}
+    for result in results:
+        key = (result['case'], result['size'])
+        label, unit = _describe(result)
+        if key in baseline_map:
+            expected = baseline_map[key]['throughput']
+            if result['throughput'] < expected * (1 - max_regression):
+                failures.append(
+                    f"{label}: 吞吐量 {result['throughput']:,.1f} {unit}，"
+                    f"比基线 {expected:,.1f} 下降超过 {max_regression:.0%}"
+                )
+        # 小规模时固定开销占主导，只对较大规模检查绝对吞吐量
+        if result['vectorized'] and result['size'] >= 10**5 \
+                and result['throughput'] < min_vectorized_throughput:
+            failures.append(
+                f"{label}: 吞吐量 {result['throughput']:,.0f} {unit}，"
+                f"低于向量化路径下限 {min_vectorized_throughput:,.0f}"
+            )
+    return failures
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='提成计算性能基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='合成数据规模')
+    parser.add_argument('--cases', nargs='+', choices=[case[0] for case in CASES + CALL_CASES], help='只运行指定用例')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次 (默认: 3)')
+    parser.add_argument('-o', '--output', default='roi_benchmark.json', help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='用于对比的历史结果 JSON 文件')
+    parser.add_argument('--max-regression', type=float, default=0.3, help='允许的吞吐量下降比例 (默认: 0.3)')
+    parser.add_argument('--min-vectorized-throughput', type=float, default=MIN_VECTORIZED_THROUGHPUT,
+                        help='向量化路径的最低吞吐量，点/秒')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.cases, args.repeat)
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    failures = check_regressions(results, baseline, args.max_regression, args.min_vectorized_throughput)
+    if failures:
+        print("性能回退：")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("性能检查通过")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import numpy as np
+from ROIfunction import calculate_commission_vectorized, STEP_MODEL
+from ROIrules import get_model
+
+# 提成规则是分段函数：ROI 方向为阶梯常数，GMV 方向在每个档位内为线性（斜率非负），
+# 因此无需网格搜索，逐个档位单元格求解析最优即可得到精确结果。
+
+def total_income(gmv, roi, target_gmv=0):
+    """计算总收入（人民币提成 + 任务量奖励），支持数组输入"""
+    _, cny, bonus = calculate_commission_vectorized(gmv, roi, target_gmv)
+    return cny + bonus
+
+def _tier_starts(thresholds, side):
+    """每个上层档位的起点：左闭区间 (side='right') 为边界本身，右闭区间为边界右侧紧邻的值"""
+    return thresholds if side == 'right' else np.nextafter(thresholds, np.inf)
+
+def _tier_ends(thresholds, side):
+    """每个下层档位的终点：右闭区间 (side='left') 为边界本身，左闭区间为边界左侧紧邻的值"""
+    return thresholds if side == 'left' else np.nextafter(thresholds, -np.inf)
+
+def enumerate_tier_cells(gmv_min, gmv_max, roi_min, roi_max):
+    """
+    列出给定范围内的所有 (GMV档位, ROI档位) 单元格，并给出每个单元格的解析最优点
+
+    参数:
+        gmv_min, gmv_max: float - GMV范围(万美元)
+        roi_min, roi_max: float - ROI范围
+
+    返回:
+        tuple[np.ndarray, np.ndarray]: (GMV候选值, ROI候选值)，形状相同
+
+    单元格内提成与 ROI 无关，取该档位在范围内的最小 ROI（最容易达到）；
+    收入随 GMV 单调不减，取该档位在范围内的最大 GMV。档位边界和开闭区间来自 step 模型。
+    """
+    model = get_model(STEP_MODEL)
+    roi_starts = _tier_starts(model.roi_thresholds, model.roi_side)
+    roi_edges = roi_starts[(roi_starts > roi_min) & (roi_starts <= roi_max)]
+    roi_candidates = np.concatenate(([roi_min], roi_edges))
+
+    gmv_ends = _tier_ends(model.gmv_thresholds, model.gmv_side)
+    gmv_edges = gmv_ends[(gmv_ends >= gmv_min) & (gmv_ends < gmv_max)]
+    gmv_candidates = np.concatenate((gmv_edges, [gmv_max]))
+
+    GMV, ROI = np.meshgrid(gmv_candidates, roi_candidates, indexing='ij')
+    return GMV.ravel(), ROI.ravel()
+
+def find_optimal_commission(gmv_min, gmv_max, roi_min, roi_max, target_gmv=0):
+    """
+    在给定的GMV/ROI范围内求精确的最优提成点
+
+    参数:
+        gmv_min, gmv_max: float - GMV范围(万美元)
+        roi_min, roi_max: float - ROI范围
+        target_gmv: float - 当月GMV目标值(万美元)
+
+    返回:
+        dict: 最优点的 gmv、roi、commission_cny、bonus、total
+
+    收入相同时优先选择 ROI 更低、GMV 更低的点。
+    """
+    gmv, roi = enumerate_tier_cells(gmv_min, gmv_max, roi_min, roi_max)
+    _, cny, bonus = calculate_commission_vectorized(gmv, roi, target_gmv)
+    total = cny + bonus
+
+    # lexsort 以最后一个键为主键：总收入降序，其次 ROI、GMV 升序
+    best = np.lexsort((gmv, roi, -total))[0]
+    return {
+        'gmv': float(gmv[best]),
+        'roi': float(roi[best]),
+        'commission_cny': float(cny[best]),
+        'bonus': float(bonus[best]),
+        'total': float(total[best])
+    }
+
+# 梯度的最小跨度：两个跳变点几乎重合时（例如任务奖励边界正好落在GMV档位边界附近）也不会除以接近 0 的数
+MIN_GRADIENT_SPAN = 0.01
+
+def _tier_span(jump_points, x, floor=0.0):
+    """
+    返回 x 所在档位的 (下一个跳变点, 档位宽度)
+
+    jump_points 为各档位的起点（进入该档位的最小取值），x 之前没有跳变点时档位从 floor 开始；
+    档位宽度不随 x 在档位内的位置变化，x 恰好位于边界时也是有限值。
+    """
+    upper = jump_points[jump_points > x]
+    if not upper.size:
+        return None, None
+    lower = jump_points[jump_points <= x]
+    start = float(lower.max()) if lower.size else floor
+    end = float(upper.min())
+    return end, max(end - start, MIN_GRADIENT_SPAN)
+
+def calculate_tier_gains(gmv, roi, target_gmv=0):
+    """
+    计算从当前位置向上跨越一个档位的收益
+
+    参数:
+        gmv: float - 当前GMV(万美元)
+        roi: float - 当前ROI值
+        target_gmv: float - 当月GMV目标值(万美元)
+
+    返回:
+        dict:
+            gmv_slope - 当前档位内每增加1万美元GMV带来的收入(万元)
+            next_gmv_tier - 下一个GMV档位/任务奖励档位 (gmv, delta_gmv, span, gain)，已到顶则为 None
+            next_roi_tier - 下一个ROI档位 (roi, delta_roi, span, gain)，已到顶则为 None
+
+    gain 为进入下一档位后的收入增量；span 为当前档位的宽度，用作平均梯度的分母。
+    delta 在边界处可以小到一个浮点步长，不能直接作为分母。
+    """
+    model = get_model(STEP_MODEL)
+    current_total = float(total_income(gmv, roi, target_gmv))
+    roi_rate = model.roi_values[model.tier_index(roi, 'roi')]
+    gmv_multiplier = model.gmv_values[model.tier_index(gmv, 'gmv')]
+
+    # GMV 方向的跳变点：GMV档位边界和任务奖励边界（完成率边界 × 目标GMV）
+    gmv_steps = [_tier_starts(model.gmv_thresholds, model.gmv_side)]
+    if target_gmv > 0 and model.bonus_thresholds is not None:
+        gmv_steps.append(_tier_starts(model.bonus_thresholds, model.bonus_side) * target_gmv)
+    next_gmv, gmv_span = _tier_span(np.concatenate(gmv_steps), gmv)
+
+    next_gmv_tier = None
+    if next_gmv is not None:
+        next_gmv_tier = {
+            'gmv': next_gmv,
+            'delta_gmv': next_gmv - gmv,
+            'span': gmv_span,
+            'gain': float(total_income(next_gmv, roi, target_gmv)) - current_total
+        }
+
+    next_roi, roi_span = _tier_span(_tier_starts(model.roi_thresholds, model.roi_side), roi)
+    next_roi_tier = None
+    if next_roi is not None:
+        next_roi_tier = {
+            'roi': next_roi,
+            'delta_roi': next_roi - roi,
+            'span': roi_span,
+            'gain': float(total_income(gmv, next_roi, target_gmv)) - current_total
+        }
+
+    return {
+        'gmv_slope': float(roi_rate * gmv_multiplier * model.usd_to_cny),
+        'next_gmv_tier': next_gmv_tier,
+        'next_roi_tier': next_roi_tier
+    }
@@ -0,0 +1,277 @@
+import bisect
+import functools
+import json
+import math
+import os
+import time
+from pathlib import Path
+import numpy as np
+
+# 默认规则文件，可通过环境变量 COMMISSION_RULES_PATH 指定其他文件
+DEFAULT_RULES_PATH = Path(__file__).with_name('commission_rules.json')
+
+INTERPOLATION_MODES = ('step', 'sigmoid')
+
+# 检查规则文件修改时间的最小间隔(秒)：逐点调用时不必每次都访问文件系统，修改最多延迟这么久生效
+RULES_CHECK_INTERVAL = 1.0
+
+_rules_versions = {}
+
+class CommissionModel:
+    """
+    编译后的提成模型：规则表在编译时转换为 NumPy 数组，evaluate 对整批输入向量化计算
+
+    mode='step' 时按档位边界查表；mode='sigmoid' 时在每个边界处用 sigmoid 平滑过渡。
+    """
+
+    def __init__(self, name, mode, roi, gmv, bonus=None, usd_to_cny=7.0, steepness=10.0):
+        if mode not in INTERPOLATION_MODES:
+            raise ValueError(f"未知的插值模式: {mode}，可选: {', '.join(INTERPOLATION_MODES)}")
+        self.name = name
+        self.mode = mode
+        self.usd_to_cny = float(usd_to_cny)
+        self.steepness = float(steepness)
+        self.roi_thresholds, self.roi_values, self.roi_side = _compile_table(roi, 'roi')
+        self.gmv_thresholds, self.gmv_values, self.gmv_side = _compile_table(gmv, 'gmv')
+        if bonus:
+            self.bonus_thresholds, self.bonus_values, self.bonus_side = _compile_table(bonus, 'bonus')
+        else:
+            self.bonus_thresholds = self.bonus_values = self.bonus_side = None
+        # sigmoid 模式下每个边界处的台阶增量，编译时算好
+        self.roi_increments = np.diff(self.roi_values)
+        self.gmv_increments = np.diff(self.gmv_values)
+        # 逐点调用时 NumPy 的调用开销远大于计算本身，标量路径使用 Python 列表
+        self._scalar_tables = {
+            field: (getattr(self, f'{field}_thresholds').tolist(),
+                    getattr(self, f'{field}_values').tolist(),
+                    getattr(self, f'{field}_increments').tolist(),
+                    getattr(self, f'{field}_side'))
+            for field in ('roi', 'gmv')
+        }
+        if self.bonus_thresholds is not None:
+            self._scalar_tables['bonus'] = (self.bonus_thresholds.tolist(), self.bonus_values.tolist(),
+                                            None, self.bonus_side)
+
+        tables = [self.roi_thresholds, self.roi_values, self.gmv_thresholds, self.gmv_values]
+        if self.bonus_thresholds is not None:
+            tables += [self.bonus_thresholds, self.bonus_values]
+        self._signature = (self.mode, self.usd_to_cny, self.steepness, self.roi_side, self.gmv_side,
+                           self.bonus_side) + tuple(tuple(table.tolist()) for table in tables)
+
+    @property
+    def signature(self):
+        """模型内容的签名，可作为缓存键"""
+        return self._signature
+
+    # 规则文件重新编译后内容不变的模型视为同一个，按模型缓存的结果继续命中
+    def __eq__(self, other):
+        return isinstance(other, CommissionModel) and self._signature == other._signature
+
+    def __hash__(self):
+        return hash(self._signature)
+
+    def _lookup(self, x, thresholds, values, increments, side):
+        # NaN 不属于任何档位，系数为 0，与原 if/elif 分档的结果一致；searchsorted 会把 NaN 放进最高档
+        missing = np.isnan(x)
+        if self.mode == 'step':
+            return np.where(missing, 0.0, values[np.searchsorted(thresholds, x, side=side)])
+
+        # sigmoid: 从基础值出发，在每个边界处叠加一次平滑的台阶增量
+        result = np.full(x.shape, values[0])
+        with np.errstate(over='ignore'):
+            for threshold, increment in zip(thresholds, increments):
+                result += increment * (1 / (1 + np.exp(-self.steepness * (x - threshold))))
+        return np.where(missing, 0.0, result)
+
+    def tier_index(self, x, field):
+        """
+        单点查询 x 在某一档位表中的档位下标
+
+        参数:
+            x: float - ROI值、GMV或目标完成率
+            field: str - 'roi'、'gmv' 或 'bonus'
+
+        返回:
+            int: 档位下标，0 表示第一个边界之前；x 为 NaN 时抛出 ValueError
+        """
+        if math.isnan(x):
+            raise ValueError(f"{field} 不是有效数值: {x}")
+        thresholds, _, _, side = self._scalar_tables[field]
+        search = bisect.bisect_right if side == 'right' else bisect.bisect_left
+        return search(thresholds, x)
+
+    def _lookup_scalar(self, x, field):
+        if math.isnan(x):
+            return 0.0
+        thresholds, values, increments, side = self._scalar_tables[field]
+        if self.mode == 'step' or field == 'bonus':
+            return values[self.tier_index(x, field)]
+
+        result = values[0]
+        for threshold, increment in zip(thresholds, increments):
+            exponent = -self.steepness * (x - threshold)
+            # exp 溢出时 sigmoid 趋近于 0
+            if exponent < 700:
+                result += increment * (1 / (1 + math.exp(exponent)))
+        return result
+
+    def evaluate_scalar(self, gmv, roi, target_gmv=0):
+        """
+        单点计算提成，结果与 evaluate 相同，适合逐条调用的场景
+
+        返回:
+            tuple[float, float, float]: (美元提成金额, 人民币提成金额, 任务量奖励) (单位：万元)
+        """
+        commission_rate = self._lookup_scalar(roi, 'roi') * self._lookup_scalar(gmv, 'gmv')
+        final_commission_usd = gmv * commission_rate
+        final_commission_cny = final_commission_usd * self.usd_to_cny
+
+        task_bonus = 0.0
+        if target_gmv > 0 and 'bonus' in self._scalar_tables:
+            task_bonus = self._lookup_scalar(gmv / target_gmv, 'bonus')
+        return final_commission_usd, final_commission_cny, task_bonus
+
+    def evaluate(self, gmv, roi, target_gmv=0):
+        """
+        向量化计算提成
+
+        参数:
+            gmv: array_like - 当月GMV(美元，万美元)
+            roi: array_like - ROI值
+            target_gmv: array_like - 当月GMV目标值(美元，万美元)，<= 0 表示未设置目标
+
+        返回:
+            tuple[np.ndarray, np.ndarray, np.ndarray]: (美元提成金额, 人民币提成金额, 任务量奖励) (单位：万元)
+        """
+        gmv, roi, target_gmv = np.broadcast_arrays(
+            np.asarray(gmv, dtype=float),
+            np.asarray(roi, dtype=float),
+            np.asarray(target_gmv, dtype=float)
+        )
+
+        roi_commission = self._lookup(roi, self.roi_thresholds, self.roi_values,
+                                      self.roi_increments, self.roi_side)
+        gmv_multiplier = self._lookup(gmv, self.gmv_thresholds, self.gmv_values,
+                                      self.gmv_increments, self.gmv_side)
+
+        commission_rate = roi_commission * gmv_multiplier
+        # inf * 0 和 inf / inf 得到 NaN，与原逐条计算的结果相同，不需要警告
+        with np.errstate(invalid='ignore'):
+            final_commission_usd = gmv * commission_rate
+        final_commission_cny = final_commission_usd * self.usd_to_cny
+
+        return final_commission_usd, final_commission_cny, self.task_bonus(gmv, target_gmv)
+
+    def task_bonus(self, gmv, target_gmv):
+        """
+        向量化计算任务量奖励，结果与 evaluate 返回的第三项相同
+
+        参数:
+            gmv: array_like - 当月GMV(美元，万美元)
+            target_gmv: array_like - 当月GMV目标值(美元，万美元)，<= 0 表示未设置目标
+
+        返回:
+            np.ndarray: 任务量奖励 (单位：万元)
+        """
+        gmv, target_gmv = np.broadcast_arrays(np.asarray(gmv, dtype=float), np.asarray(target_gmv, dtype=float))
+        if self.bonus_thresholds is None:
+            return np.zeros(gmv.shape)
+
+        # 任务量奖励始终按档位计算，不做平滑
+        has_target = target_gmv > 0
+        with np.errstate(invalid='ignore'):
+            completion_rate = np.divide(gmv, target_gmv, out=np.zeros(gmv.shape), where=has_target)
+        return np.where(
+            has_target & ~np.isnan(completion_rate),
+            self.bonus_values[np.searchsorted(self.bonus_thresholds, completion_rate, side=self.bonus_side)],
+            0.0
+        )
+
+def _compile_table(table, field):
+    """把规则表中的一段 {thresholds, values, closed} 编译为 (边界数组, 系数数组, searchsorted side)"""
+    thresholds = np.asarray(table['thresholds'], dtype=float)
+    values = np.asarray(table['values'], dtype=float)
+    if len(values) != len(thresholds) + 1:
+        raise ValueError(f"{field} 规则的 values 数量必须比 thresholds 多 1")
+    if np.any(np.diff(thresholds) <= 0):
+        raise ValueError(f"{field} 规则的 thresholds 必须严格递增")
+
+    # 左闭区间 (x >= 边界即升档) 对应 side='right'，右闭区间对应 side='left'
+    closed = table.get('closed', 'left')
+    if closed not in ('left', 'right'):
+        raise ValueError(f"{field} 规则的 closed 只能是 'left' 或 'right'")
+    side = 'right' if closed == 'left' else 'left'
+
+    thresholds.setflags(write=False)
+    values.setflags(write=False)
+    return thresholds, values, side
+
+def _resolve_rules_path(path=None):
+    return _resolve_path(str(path or os.environ.get('COMMISSION_RULES_PATH', DEFAULT_RULES_PATH)))
+
+@functools.lru_cache(maxsize=16)
+def _resolve_path(path):
+    return str(Path(path).resolve())
+
+def load_rules(path=None):
+    """
+    读取提成规则配置文件
+
+    参数:
+        path: str | Path - 规则文件路径，默认读取 COMMISSION_RULES_PATH 或 commission_rules.json
+
+    返回:
+        dict: 规则配置
+    """
+    with open(_resolve_rules_path(path), encoding='utf-8') as f:
+        return json.load(f)
+
+def compile_model(name, spec):
+    """把单个模型的配置编译为 CommissionModel"""
+    return CommissionModel(
+        name=name,
+        mode=spec.get('mode', 'step'),
+        roi=spec['roi'],
+        gmv=spec['gmv'],
+        bonus=spec.get('bonus'),
+        usd_to_cny=spec.get('usd_to_cny', 7.0),
+        steepness=spec.get('steepness', 10.0)
+    )
+
+def _rules_version(path=None):
+    """返回 (规则文件路径, 修改时间)，检查间隔内复用上一次的结果（包括 COMMISSION_RULES_PATH 的取值）"""
+    now = time.monotonic()
+    version = _rules_versions.get(path)
+    if version is None or now - version[2] >= RULES_CHECK_INTERVAL:
+        resolved = _resolve_rules_path(path)
+        version = (resolved, os.stat(resolved).st_mtime_ns, now)
+        _rules_versions[path] = version
+    return version[0], version[1]
+
+@functools.lru_cache(maxsize=8)
+def _compile_rules(path, mtime):
+    rules = load_rules(path)
+    models = {name: compile_model(name, spec) for name, spec in rules['models'].items()}
+    return models, rules.get('default_model', next(iter(models)))
+
+def get_model(name=None, path=None):
+    """
+    获取编译后的提成模型，规则文件只在修改后才重新编译（最多延迟 RULES_CHECK_INTERVAL 秒生效）
+
+    参数:
+        name: str - 模型名称，None 表示配置中的 default_model
+        path: str | Path - 规则文件路径
+
+    返回:
+        CommissionModel: 编译后的模型
+    """
+    models, default_name = _compile_rules(*_rules_version(path))
+    name = name or default_name
+    if name not in models:
+        raise KeyError(f"规则文件中没有名为 {name} 的模型，可选: {', '.join(models)}")
+    return models[name]
+
+def list_models(path=None):
+    """列出规则文件中的所有模型名称"""
+    models, _ = _compile_rules(*_rules_version(path))
+    return list(models)
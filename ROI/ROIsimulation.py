@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ROIfunction import STEP_MODEL
+from ROIrules import get_model
+
+# 每个进程至少处理的样本数，样本太少时进程启动开销大于收益
+MIN_SAMPLES_PER_WORKER = 250_000
+
+def draw_samples(dist, n, rng):
+    """
+    按分布描述抽样
+
+    参数:
+        dist: dict | float - 分布描述：
+            {'type': 'normal', 'mean': 均值, 'std': 标准差}
+            {'type': 'empirical', 'samples': [历史月份的取值, ...]}（有放回抽样）
+            或直接给一个数值表示确定值
+        n: int - 样本数
+        rng: np.random.Generator - 随机数生成器
+
+    返回:
+        np.ndarray: 样本
+    """
+    if not isinstance(dist, dict):
+        return np.full(n, float(dist))
+    if dist['type'] == 'normal':
+        return rng.normal(dist['mean'], dist['std'], n)
+    if dist['type'] == 'empirical':
+        return rng.choice(np.asarray(dist['samples'], dtype=float), n)
+    raise ValueError(f"未知的分布类型: {dist['type']}，可选: normal, empirical")
+
+def _tier_counts(thresholds, side, x):
+    """统计 x 落在每个档位的样本数"""
+    return np.bincount(np.searchsorted(thresholds, x, side=side), minlength=len(thresholds) + 1)
+
+def _simulate_chunk(current_gmv, remaining_gmv_dist, roi_dist, target_gmv, n, seed, model_name):
+    """在单个进程内模拟 n 个样本，返回总收入样本和各档位的计数"""
+    rng = np.random.default_rng(seed)
+    model = get_model(model_name)
+
+    # 月末GMV = 已完成GMV + 剩余天数的GMV（不会为负）
+    gmv = current_gmv + np.maximum(draw_samples(remaining_gmv_dist, n, rng), 0.0)
+    roi = draw_samples(roi_dist, n, rng)
+
+    _, cny, bonus = model.evaluate(gmv, roi, target_gmv)
+    total = cny + bonus
+
+    counts = {
+        'roi': _tier_counts(model.roi_thresholds, model.roi_side, roi),
+        'gmv': _tier_counts(model.gmv_thresholds, model.gmv_side, gmv)
+    }
+    if target_gmv > 0 and model.bonus_thresholds is not None:
+        counts['bonus'] = _tier_counts(model.bonus_thresholds, model.bonus_side, gmv / target_gmv)
+    return total, cny.sum(), bonus.sum(), counts
+
+def _reach_probability(thresholds, counts, n):
+    """由各档位计数得到达到每个档位边界的概率 P(档位 >= k)"""
+    reach = np.cumsum(counts[::-1])[::-1][1:] / n
+    return [(float(t), float(p)) for t, p in zip(thresholds, reach)]
+
+def simulate_commission(current_gmv, remaining_gmv_dist, roi_dist, target_gmv=0,
+                        n_samples=1_000_000, workers=None, seed=None,
+                        percentiles=(5, 25, 50, 75, 95), model_name=STEP_MODEL):
+    """
+    蒙特卡洛模拟月末提成的分布
+
+    参数:
+        current_gmv: float - 当月已完成GMV(万美元)
+        remaining_gmv_dist: dict | float - 本月剩余时间新增GMV的分布(万美元)，格式见 draw_samples
+        roi_dist: dict | float - 月末ROI的分布
+        target_gmv: float - 当月GMV目标值(万美元)，<= 0 表示未设置目标
+        n_samples: int - 样本数
+        workers: int - 进程数，None 表示使用全部CPU核心；样本较少时自动在当前进程内计算
+        seed: int - 随机种子，相同种子与进程数下结果可复现
+        percentiles: tuple - 需要计算的总收入分位数
+        model_name: str - commission_rules.json 中的模型名称 (默认: step)
+
+    返回:
+        dict: 期望收入、分位数，以及达到每个 ROI/GMV/任务奖励档位的概率
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, n_samples // MIN_SAMPLES_PER_WORKER))
+
+    # 每个进程使用独立的随机数流
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    sizes = [n_samples // workers + (1 if i < n_samples % workers else 0) for i in range(workers)]
+    args = [(current_gmv, remaining_gmv_dist, roi_dist, target_gmv, size, child, model_name)
+            for size, child in zip(sizes, seeds)]
+
+    if workers == 1:
+        chunks = [_simulate_chunk(*args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_simulate_chunk, *zip(*args)))
+
+    total = np.concatenate([chunk[0] for chunk in chunks])
+    counts = {key: sum(chunk[3][key] for chunk in chunks) for key in chunks[0][3]}
+    model = get_model(model_name)
+
+    results = {
+        'n_samples': n_samples,
+        'expected_total': float(total.mean()),
+        'std_total': float(total.std()),
+        'expected_commission_cny': float(sum(chunk[1] for chunk in chunks) / n_samples),
+        'expected_bonus': float(sum(chunk[2] for chunk in chunks) / n_samples),
+        'percentiles': dict(zip(percentiles, np.percentile(total, percentiles).tolist())),
+        'roi_tier_probability': _reach_probability(model.roi_thresholds, counts['roi'], n_samples),
+        'gmv_tier_probability': _reach_probability(model.gmv_thresholds, counts['gmv'], n_samples),
+        'bonus_tier_probability': []
+    }
+    if 'bonus' in counts:
+        results['bonus_tier_probability'] = _reach_probability(model.bonus_thresholds, counts['bonus'], n_samples)
+    return results
@@ -0,0 +1,130 @@
+import functools
+import numpy as np
+from ROIfunction import STEP_MODEL
+from ROIrules import get_model
+
+def _refined_axis(lo, hi, resolution, thresholds, side):
+    """
+    生成自适应采样轴：在均匀粗网格的基础上，只在档位边界两侧各补一个采样点
+
+    参数:
+        lo, hi: float - 轴范围
+        resolution: int - 粗网格点数
+        thresholds: np.ndarray - 档位边界
+        side: str - 模型的 searchsorted side：'right' 表示达到边界即升档 (ROI)，'left' 表示超过边界才升档 (GMV)
+    """
+    edges = thresholds[(thresholds > lo) & (thresholds < hi)]
+    if side == 'right':
+        # roi >= 边界即升档，补上边界左侧紧邻的点
+        extra = np.concatenate((edges, np.nextafter(edges, -np.inf)))
+    else:
+        # gmv > 边界才升档，补上边界右侧紧邻的点
+        extra = np.concatenate((edges, np.nextafter(edges, np.inf)))
+    return np.unique(np.concatenate((np.linspace(lo, hi, resolution), extra)))
+
+@functools.lru_cache(maxsize=8)
+def _cached_tensor(model, roi_min, roi_max, gmv_min, gmv_max, target_min, target_max, target_step, resolution):
+    # 模型按 CommissionModel.signature 比较和哈希：规则文件内容变化后缓存不再命中
+    roi_axis = _refined_axis(roi_min, roi_max, resolution, model.roi_thresholds, model.roi_side)
+    gmv_axis = _refined_axis(gmv_min, gmv_max, resolution, model.gmv_thresholds, model.gmv_side)
+    n_targets = int(round((target_max - target_min) / target_step)) + 1
+    target_axis = target_min + target_step * np.arange(n_targets)
+
+    _, cny_amount, bonus = model.evaluate(gmv_axis[None, :, None], roi_axis[None, None, :], target_axis[:, None, None])
+    tensor = cny_amount + bonus
+
+    # 结果在所有会话之间共享，设为只读防止被调用方意外修改
+    for array in (roi_axis, gmv_axis, target_axis, tensor):
+        array.setflags(write=False)
+    return roi_axis, gmv_axis, target_axis, tensor
+
+def get_commission_tensor(roi_min=1.0, roi_max=3.5, gmv_min=0.5, gmv_max=60.0,
+                          target_min=0.0, target_max=100.0, target_step=1.0,
+                          resolution=20, model_name=STEP_MODEL):
+    """
+    获取预计算的 (目标GMV, GMV, ROI) 三维总收入张量，包含任务量奖励，进程内所有会话共享
+
+    参数:
+        roi_min, roi_max: float - ROI范围
+        gmv_min, gmv_max: float - GMV范围(万美元)
+        target_min, target_max, target_step: float - 目标GMV轴的范围和步长(万美元)
+        resolution: int - ROI/GMV 自适应网格的粗网格点数
+        model_name: str - commission_rules.json 中的模型名称 (默认: step)
+
+    返回:
+        tuple: (roi_axis, gmv_axis, target_axis, tensor)，tensor 形状为 (目标数, GMV点数, ROI点数)
+    """
+    return _cached_tensor(
+        get_model(model_name),
+        float(roi_min), float(roi_max), float(gmv_min), float(gmv_max),
+        float(target_min), float(target_max), float(target_step),
+        int(resolution)
+    )
+
+def _target_layer(target_axis, target_gmv):
+    """目标值正好落在目标GMV轴上时返回该层下标，否则返回 None"""
+    step = target_axis[1] - target_axis[0] if len(target_axis) > 1 else 1.0
+    layer = int(round((target_gmv - target_axis[0]) / step))
+    if 0 <= layer < len(target_axis) and np.isclose(target_axis[layer], target_gmv, rtol=0, atol=1e-9):
+        return layer
+    return None
+
+def get_target_surface(tensor, target_gmv, model_name=STEP_MODEL):
+    """
+    取出给定目标GMV下的 (ROI, GMV, Z) 曲面
+
+    目标值落在目标GMV轴上时直接取预计算切片；不在轴上或超出轴范围时，用模型在同一 ROI/GMV 网格上精确计算，
+    不在相邻两层间插值（任务量奖励是阶梯函数，插值会得到两档之间并不存在的收入）
+
+    参数:
+        tensor: tuple - get_commission_tensor 的返回值
+        target_gmv: float - 目标GMV(万美元)
+        model_name: str - 生成张量时使用的模型名称 (默认: step)
+
+    返回:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: ROI、GMV 网格和总收入 Z (万元)
+    """
+    roi_axis, gmv_axis, target_axis, values = tensor
+    ROI, GMV = np.meshgrid(roi_axis, gmv_axis)
+    layer = _target_layer(target_axis, float(target_gmv))
+    if layer is not None:
+        return ROI, GMV, values[layer]
+
+    _, cny_amount, bonus = get_model(model_name).evaluate(GMV, ROI, target_gmv)
+    return ROI, GMV, cny_amount + bonus
+
+def query_commission_tensor(tensor, gmv, roi, target_gmv=0, model_name=STEP_MODEL):
+    """
+    从张量中查询总收入，每次查询只做常数次运算（轴长度很小的二分查找 + 加权求和）
+
+    参数:
+        tensor: tuple - get_commission_tensor 的返回值
+        gmv, roi, target_gmv: array_like - 查询点
+        model_name: str - 生成张量时使用的模型名称 (默认: step)
+
+    返回:
+        np.ndarray: 总收入(万元)
+
+    人民币提成与目标无关：ROI 轴包含所有档位边界，按所在档位取值；GMV 轴包含档位边界两侧的点，档位内线性插值，
+    阶梯模型下两者都是精确的。任务量奖励的边界随目标值变化、不在 GMV 轴上，因此不从张量插值，
+    而是按完成率直接查奖励档位。GMV 或 ROI 超出网格范围的点用模型精确计算
+    """
+    roi_axis, gmv_axis, target_axis, values = tensor
+    model = get_model(model_name)
+    gmv, roi, target_gmv = np.broadcast_arrays(
+        np.asarray(gmv, dtype=float), np.asarray(roi, dtype=float), np.asarray(target_gmv, dtype=float)
+    )
+
+    i = np.clip(np.searchsorted(roi_axis, roi, side='right') - 1, 0, len(roi_axis) - 1)
+    j = np.clip(np.searchsorted(gmv_axis, gmv, side='right') - 1, 0, len(gmv_axis) - 2)
+    gmv_weight = np.clip((gmv - gmv_axis[j]) / (gmv_axis[j + 1] - gmv_axis[j]), 0, 1)
+
+    # 人民币提成与目标无关，取第一层减去该层在网格点上的奖励即可
+    def cny_at(index):
+        return values[0, index, i] - model.task_bonus(gmv_axis[index], target_axis[0])
+
+    cny_amount = np.asarray((1 - gmv_weight) * cny_at(j) + gmv_weight * cny_at(j + 1))
+    outside = ~((roi >= roi_axis[0]) & (roi <= roi_axis[-1]) & (gmv >= gmv_axis[0]) & (gmv <= gmv_axis[-1]))
+    if outside.any():
+        cny_amount[outside] = model.evaluate(gmv[outside], roi[outside])[1]
+    return cny_amount + model.task_bonus(gmv, target_gmv)
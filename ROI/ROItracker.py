@@ -0,0 +1,172 @@
+from array import array
+from ROIfunction import STEP_MODEL
+from ROIrules import get_model
+
+TIER_AXES = ('roi', 'gmv', 'bonus')
+
+def _tiers(model, gmv, roi, target_gmv):
+    """返回 (ROI档位, GMV档位, 任务奖励档位) 下标，区间开闭与模型一致"""
+    has_bonus = target_gmv > 0 and model.bonus_thresholds is not None
+    bonus_tier = model.tier_index(gmv / target_gmv, 'bonus') if has_bonus else 0
+    return model.tier_index(roi, 'roi'), model.tier_index(gmv, 'gmv'), bonus_tier
+
+class CommissionTracker:
+    """
+    月度提成增量跟踪器
+
+    按销售人员累计每日的GMV和投放花费增量，每条事件 O(1) 更新累计值、当前档位和提成，
+    并在档位发生变化时返回跨档事件，无需回扫历史数据。
+    累计值保存在紧凑的 array 中，rep_id 只用于定位下标。
+    每次刷新时按 model_name 取编译后的模型，规则文件修改后的事件按新规则计算。
+    """
+
+    def __init__(self, model_name=STEP_MODEL):
+        self.model_name = model_name
+        self._index = {}
+        self._rep_ids = []
+        self._gmv = array('d')
+        self._spend = array('d')
+        self._target = array('d')
+        self._total = array('d')
+        self._roi_tier = array('b')
+        self._gmv_tier = array('b')
+        self._bonus_tier = array('b')
+
+    def __len__(self):
+        return len(self._rep_ids)
+
+    def __contains__(self, rep_id):
+        return rep_id in self._index
+
+    def _slot(self, rep_id):
+        slot = self._index.get(rep_id)
+        if slot is None:
+            slot = len(self._rep_ids)
+            self._index[rep_id] = slot
+            self._rep_ids.append(rep_id)
+            for column in (self._gmv, self._spend, self._target, self._total):
+                column.append(0.0)
+            roi_tier, gmv_tier, bonus_tier = _tiers(get_model(self.model_name), 0.0, 0.0, 0.0)
+            self._roi_tier.append(roi_tier)
+            self._gmv_tier.append(gmv_tier)
+            self._bonus_tier.append(bonus_tier)
+        return slot
+
+    def _refresh(self, rep_id, slot):
+        """根据累计值重新计算档位和提成，返回跨档事件"""
+        gmv, spend, target_gmv = self._gmv[slot], self._spend[slot], self._target[slot]
+        roi = gmv / spend if spend > 0 else 0.0
+        model = get_model(self.model_name)
+        _, cny, bonus = model.evaluate_scalar(gmv, roi, target_gmv)
+        self._total[slot] = cny + bonus
+
+        crossings = []
+        new_tiers = _tiers(model, gmv, roi, target_gmv)
+        for axis, column, new_tier in zip(TIER_AXES, (self._roi_tier, self._gmv_tier, self._bonus_tier), new_tiers):
+            old_tier = column[slot]
+            if new_tier != old_tier:
+                column[slot] = new_tier
+                crossings.append({
+                    'rep_id': rep_id,
+                    'axis': axis,
+                    'from_tier': old_tier,
+                    'to_tier': new_tier,
+                    'direction': 'up' if new_tier > old_tier else 'down',
+                    'gmv': gmv,
+                    'roi': roi,
+                    'total_income': self._total[slot]
+                })
+        return crossings
+
+    def set_target(self, rep_id, target_gmv):
+        """
+        设置销售人员的当月GMV目标
+
+        参数:
+            rep_id: 销售人员标识
+            target_gmv: float - 当月GMV目标值(万美元)，0 表示未设置目标
+
+        返回:
+            list[dict]: 目标变化引起的跨档事件
+        """
+        slot = self._slot(rep_id)
+        self._target[slot] = float(target_gmv)
+        return self._refresh(rep_id, slot)
+
+    def update(self, rep_id, gmv_delta=0.0, spend_delta=0.0):
+        """
+        处理一条增量事件
+
+        参数:
+            rep_id: 销售人员标识
+            gmv_delta: float - 新增GMV(万美元)，退款可为负数
+            spend_delta: float - 新增投放花费(万美元)
+
+        返回:
+            list[dict]: 跨档事件，每条包含 rep_id、axis(roi/gmv/bonus)、from_tier、to_tier、direction 等
+        """
+        slot = self._slot(rep_id)
+        self._gmv[slot] += gmv_delta
+        self._spend[slot] += spend_delta
+        return self._refresh(rep_id, slot)
+
+    def process_events(self, events, on_crossing=None):
+        """
+        处理整个团队的事件流
+
+        参数:
+            events: Iterable - (rep_id, gmv_delta, spend_delta) 元组或包含同名键的字典
+            on_crossing: callable - 每发生一次跨档时调用 on_crossing(event)
+
+        返回:
+            list[dict]: 所有跨档事件
+        """
+        crossings = []
+        for event in events:
+            if isinstance(event, dict):
+                event_crossings = self.update(event['rep_id'], event.get('gmv_delta', 0.0),
+                                              event.get('spend_delta', 0.0))
+            else:
+                event_crossings = self.update(*event)
+            if on_crossing:
+                for crossing in event_crossings:
+                    on_crossing(crossing)
+            crossings.extend(event_crossings)
+        return crossings
+
+    def get_status(self, rep_id):
+        """
+        获取销售人员当前的累计值、档位和提成
+
+        返回:
+            dict: gmv、spend、roi、target_gmv、各档位下标、美元/人民币提成、任务量奖励和总收入
+        """
+        slot = self._index[rep_id]
+        gmv, spend, target_gmv = self._gmv[slot], self._spend[slot], self._target[slot]
+        roi = gmv / spend if spend > 0 else 0.0
+        usd, cny, bonus = get_model(self.model_name).evaluate_scalar(gmv, roi, target_gmv)
+        return {
+            'rep_id': rep_id,
+            'gmv': gmv,
+            'spend': spend,
+            'roi': roi,
+            'target_gmv': target_gmv,
+            'roi_tier': self._roi_tier[slot],
+            'gmv_tier': self._gmv_tier[slot],
+            'bonus_tier': self._bonus_tier[slot],
+            'commission_usd': usd,
+            'commission_cny': cny,
+            'task_bonus': bonus,
+            'total_income': self._total[slot]
+        }
+
+    def snapshot(self):
+        """返回所有销售人员的当前状态"""
+        return [self.get_status(rep_id) for rep_id in self._rep_ids]
+
+    def reset_month(self, keep_targets=False):
+        """月初清零累计值，可选保留各人的目标"""
+        targets = {rep_id: self._target[slot] for rep_id, slot in self._index.items()} if keep_targets else {}
+        self.__init__(self.model_name)
+        for rep_id, target_gmv in targets.items():
+            self.set_target(rep_id, target_gmv)
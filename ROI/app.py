@@ -1,9 +1,8 @@
 import streamlit as st
-import numpy as np
 import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 from ROIanalysis import analyze_commission
 from ROIfunction import calculate_commission
+from ROIsimulation import simulate_commission
 
 def main():
     # 设置页面标题
@@ -86,19 +85,40 @@ def main():
     # 添加分割线
     st.markdown("---本月优化分析---")
     
-    # 添加分析按钮
+    # 选择图表渲染方式：Plotly 在浏览器端渲染和旋转，服务端只发送降采样后的曲面数据
+    renderer = st.radio(
+        '图表类型',
+        options=['plotly', 'matplotlib'],
+        format_func=lambda x: {'plotly': '交互式3D (Plotly)', 'matplotlib': '静态图 (Matplotlib)'}[x],
+        horizontal=True
+    )
+    
+    # 目标GMV假设：曲面来自预计算张量，拖动时只取切片，无需重新计算
+    what_if_target = st.slider(
+        '假设GMV目标值 (万美元)',
+        min_value=0.0,
+        max_value=100.0,
+        value=float(target_gmv),
+        step=1.0,
+        help='拖动查看不同目标值下任务量奖励对最优路径的影响'
+    )
+    
+    # 添加分析按钮，点击后在本次会话中保持显示，拖动滑块时图表随之更新
     if st.button('开始分析'):
-        # 创建图形
-        fig = plt.figure(figsize=(12, 8))
-        
+        st.session_state['show_analysis'] = True
+    
+    if st.session_state.get('show_analysis'):
         # 调用分析函数
-        analyze_commission(current_gmv, current_roi)
+        analysis = analyze_commission(current_gmv, current_roi, renderer=renderer, target_gmv=what_if_target)
+        fig = analysis['figure']
         
         # 显示图形
-        st.pyplot(plt)
-        
-        # 清除当前图形，为下次分析做准备
-        plt.close()
+        if renderer == 'plotly':
+            st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.pyplot(fig)
+            # 释放图形，避免长时间运行的服务累积内存
+            plt.close(fig)
         
         # 添加说明
         st.write("""
@@ -110,5 +130,43 @@ def main():
         - 灰色虚线：优化路径
         """)
 
+    # 月末收入模拟
+    st.markdown("---月末收入模拟---")
+    with st.expander("根据剩余时间的GMV/ROI预期模拟月末收入"):
+        sim_col1, sim_col2 = st.columns(2)
+        with sim_col1:
+            remaining_gmv_mean = st.number_input('剩余时间新增GMV均值 (万美元)', min_value=0.0, value=5.0, step=0.5)
+            remaining_gmv_std = st.number_input('剩余时间新增GMV标准差 (万美元)', min_value=0.0, value=2.0, step=0.5)
+        with sim_col2:
+            roi_mean = st.number_input('月末ROI均值', min_value=0.0, value=float(current_roi), step=0.1)
+            roi_std = st.number_input('月末ROI标准差', min_value=0.0, value=0.2, step=0.05)
+
+        if st.button('开始模拟'):
+            results = simulate_commission(
+                current_gmv,
+                {'type': 'normal', 'mean': remaining_gmv_mean, 'std': remaining_gmv_std},
+                {'type': 'normal', 'mean': roi_mean, 'std': roi_std},
+                target_gmv=target_gmv
+            )
+
+            st.metric(label="预期总收入", value=f"{results['expected_total']:.2f}万元")
+            st.write("#### 总收入分位数（万元）")
+            st.table({f"P{p}": [f"{value:.2f}"] for p, value in results['percentiles'].items()})
+
+            st.write("#### 达到各档位的概率")
+            st.table({
+                'ROI档位': [f"ROI ≥ {t}" for t, _ in results['roi_tier_probability']],
+                '概率': [f"{p:.1%}" for _, p in results['roi_tier_probability']]
+            })
+            st.table({
+                'GMV档位': [f"GMV > {t:g}万美元" for t, _ in results['gmv_tier_probability']],
+                '概率': [f"{p:.1%}" for _, p in results['gmv_tier_probability']]
+            })
+            if results['bonus_tier_probability']:
+                st.table({
+                    '任务量奖励档位': [f"完成率 ≥ {t:.0%}" for t, _ in results['bonus_tier_probability']],
+                    '概率': [f"{p:.1%}" for _, p in results['bonus_tier_probability']]
+                })
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ROIbatch import calculate_chunk, run_batch
+
+def test_blank_and_invalid_cells_marked_as_errors():
+    # 空白单元格读入后是 NaN，不能被分到最高档位
+    chunk = pd.DataFrame({
+        'gmv': [np.nan, 10.0, 10.0, 12.0],
+        'roi': [2.0, 2.0, 'abc', 2.5],
+        'target_gmv': [5.0, 5.0, np.nan, 'x']
+    })
+    result = calculate_chunk(chunk)
+    assert list(result['error']) == [
+        'gmv 为空或不是有效数值', '', 'roi 为空或不是有效数值', 'target_gmv 为空或不是有效数值'
+    ]
+    invalid = result['error'] != ''
+    assert result.loc[invalid, ['commission_usd', 'commission_cny', 'task_bonus', 'total_income']].isna().all().all()
+    np.testing.assert_allclose(result.loc[1, ['commission_usd', 'task_bonus']].astype(float), [0.12, 0.2])
+
+def test_missing_required_column():
+    with pytest.raises(ValueError):
+        calculate_chunk(pd.DataFrame({'gmv': [1.0]}))
+
+def test_run_batch_counts_invalid_rows(tmp_path):
+    source = tmp_path / 'sales.csv'
+    source.write_text('gmv,roi,target_gmv\n,2.0,5.0\n10,2.0,5\n8,,\n', encoding='utf-8')
+    stats = run_batch(source, tmp_path / 'out.csv', chunksize=2)
+    assert stats['rows'] == 3
+    assert stats['invalid_rows'] == 2
+    output = pd.read_csv(tmp_path / 'out.csv', encoding='utf-8-sig')
+    assert output['task_bonus'].isna().sum() == 2
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from ROIfunction import calculate_commission, calculate_commission_vectorized, STEP_MODEL
+from ROIrules import get_model
+
+NAN = float('nan')
+
+@pytest.mark.parametrize('gmv, roi, target_gmv, expected', [
+    (10.0, NAN, 0, (0.0, 0.0, 0.0)),
+    (10.0, NAN, 5.0, (0.0, 0.0, 0.2)),
+    (NAN, 2.0, 5.0, (NAN, NAN, 0.0)),
+    (10.0, 2.0, NAN, (0.12, 0.84, 0.0)),
+    (NAN, NAN, NAN, (NAN, NAN, 0.0)),
+])
+def test_nan_inputs_fall_in_no_tier(gmv, roi, target_gmv, expected):
+    # 原 if/elif 分档中 NaN 不满足任何条件，对应的系数或奖励为 0；不能被 searchsorted 放进最高档
+    scalar = calculate_commission(gmv, roi, target_gmv)
+    vectorized = tuple(float(x) for x in calculate_commission_vectorized(gmv, roi, target_gmv))
+    for result in (scalar, vectorized):
+        np.testing.assert_allclose(result, expected)
+
+def test_tier_index_rejects_nan():
+    with pytest.raises(ValueError):
+        get_model(STEP_MODEL).tier_index(NAN, 'roi')
+
+def test_vectorized_matches_scalar_with_nan():
+    gmv = np.array([1.0, NAN, 12.0, 60.0])
+    roi = np.array([NAN, 2.0, 2.5, 3.2])
+    usd, cny, bonus = calculate_commission_vectorized(gmv, roi, 10.0)
+    for i in range(len(gmv)):
+        expected = calculate_commission(gmv[i], roi[i], 10.0)
+        np.testing.assert_equal((usd[i], cny[i], bonus[i]), expected)
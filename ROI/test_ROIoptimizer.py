@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from ROIanalysis import calculate_gradient_gmv, calculate_gradient_roi
+from ROIfunction import STEP_MODEL
+from ROIoptimizer import calculate_tier_gains
+from ROIrules import get_model
+
+# 收入每万美元GMV的变化不会超过最高提成率下单个档位跳变的量级，梯度应远小于该上限
+GRADIENT_LIMIT = 100.0
+
+def _boundary_points():
+    """所有档位边界及其两侧紧邻的点"""
+    model = get_model(STEP_MODEL)
+    points = []
+    for gmv in model.gmv_thresholds:
+        for g in (np.nextafter(gmv, -np.inf), gmv, np.nextafter(gmv, np.inf)):
+            points.append((float(g), 2.0, 0))
+            points.append((float(g), 2.0, 10.0))
+    for roi in model.roi_thresholds:
+        for r in (np.nextafter(roi, -np.inf), roi, np.nextafter(roi, np.inf)):
+            points.append((12.0, float(r), 0))
+    for rate in model.bonus_thresholds:
+        points.append((float(rate * 10.0), 2.0, 10.0))
+    return points
+
+@pytest.mark.parametrize('gmv, roi, target_gmv', _boundary_points())
+def test_gradient_finite_at_tier_boundary(gmv, roi, target_gmv):
+    for gradient in (calculate_gradient_gmv(gmv, roi, target_gmv), calculate_gradient_roi(gmv, roi, target_gmv)):
+        assert np.isfinite(gradient)
+        assert abs(gradient) < GRADIENT_LIMIT
+
+def test_tier_span_independent_of_position():
+    # 同一档位内不同位置使用相同的跨度，边界上的点不会得到退化的跨度
+    at_edge = calculate_tier_gains(1.5, 2.0)['next_gmv_tier']
+    inside = calculate_tier_gains(0.75, 2.0)['next_gmv_tier']
+    assert at_edge['delta_gmv'] < 1e-12
+    assert at_edge['span'] == pytest.approx(inside['span'])
+    assert at_edge['gain'] > 0
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from ROIfunction import STEP_MODEL
+from ROIrules import get_model
+from ROIsurface import get_commission_tensor, get_target_surface, query_commission_tensor
+
+def _tensor():
+    return get_commission_tensor(roi_min=1.0, roi_max=3.5, gmv_min=0.5, gmv_max=60.0,
+                                 target_min=0.0, target_max=100.0, target_step=1.0, resolution=20)
+
+def _exact_total(gmv, roi, target_gmv):
+    _, cny, bonus = get_model(STEP_MODEL).evaluate(gmv, roi, target_gmv)
+    return cny + bonus
+
+@pytest.mark.parametrize('target_gmv', [0.0, 12.0, 12.5, 37.3, 100.0, 150.0])
+def test_target_surface_matches_model(target_gmv):
+    ROI, GMV, Z = get_target_surface(_tensor(), target_gmv)
+    np.testing.assert_allclose(Z, _exact_total(GMV, ROI, target_gmv), rtol=0, atol=1e-12)
+
+def test_query_matches_model_at_bonus_edges():
+    model = get_model(STEP_MODEL)
+    target_gmv = 12.5
+    edges = model.bonus_thresholds * target_gmv
+    gmv = np.concatenate((edges, np.nextafter(edges, -np.inf), np.nextafter(edges, np.inf),
+                          model.gmv_thresholds, np.nextafter(model.gmv_thresholds, np.inf),
+                          np.linspace(0.5, 60.0, 97)))
+    roi = np.concatenate((model.roi_thresholds, np.nextafter(model.roi_thresholds, -np.inf),
+                          np.linspace(1.0, 3.5, 41)))
+    gmv, roi = np.meshgrid(gmv, roi)
+    for target in (0.0, target_gmv, 150.0):
+        np.testing.assert_allclose(query_commission_tensor(_tensor(), gmv, roi, target),
+                                   _exact_total(gmv, roi, target), rtol=0, atol=1e-12)
+
+def test_query_outside_grid_uses_model():
+    gmv = np.array([0.1, 80.0, 12.0, 12.0])
+    roi = np.array([2.0, 2.0, 0.5, 4.0])
+    np.testing.assert_allclose(query_commission_tensor(_tensor(), gmv, roi, 10.0),
+                               _exact_total(gmv, roi, 10.0), rtol=0, atol=1e-12)
+
+def test_query_scalar():
+    assert query_commission_tensor(_tensor(), 80.0, 2.0, 10.0) == pytest.approx(_exact_total(80.0, 2.0, 10.0))
+    assert query_commission_tensor(_tensor(), 12.0, 2.0, 10.0) == pytest.approx(_exact_total(12.0, 2.0, 10.0))
@@ -0,0 +1,229 @@
+import mimetypes
+import os
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+# 视频下载和格式转换共用的文件服务，大文件直接从磁盘发送给浏览器，不经过 Streamlit 读入内存。
+# 默认只监听本机；需要让其他机器下载时，把 VIDEO_FILE_SERVER_HOST 设置为可访问的地址（链接使用浏览器打开页面时的主机名），
+# 或通过反向代理对外提供，并把 VIDEO_FILE_SERVER_URL 设置为浏览器能访问到的地址
+FILE_SERVER_HOST = os.environ.get('VIDEO_FILE_SERVER_HOST', '127.0.0.1')
+FILE_SERVER_PORT = int(os.environ.get('VIDEO_FILE_SERVER_PORT', 8601))
+FILE_SERVER_URL = os.environ.get('VIDEO_FILE_SERVER_URL')
+
+# 从这些主机名打开页面的浏览器使用 localhost 链接
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# 下载链接有效期(秒)以及不支持 sendfile 时每次读取的块大小
+FILE_TTL = 3600
+CHUNK_SIZE = 1024 * 1024
+
+_RANGE_PATTERN = re.compile(r'bytes=(\d*)-(\d*)$')
+
+_files = {}
+_files_lock = threading.Lock()
+_server = None
+_server_error = None
+_server_lock = threading.Lock()
+
+def _parse_range(header, file_size):
+    """解析单段 Range 请求头，返回 (start, end)，无效时返回 None"""
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N 表示最后 N 个字节
+        start, end = max(0, file_size - int(end)), file_size - 1
+    else:
+        start = int(start)
+        end = min(int(end), file_size - 1) if end else file_size - 1
+    if start > end or start >= file_size:
+        return None
+    return start, end
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """按令牌提供已发布的文件，支持 Range 断点续传，使用 sendfile 零拷贝发送"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        token = self.path.lstrip('/').split('/', 1)[0]
+        with _files_lock:
+            entry = _files.get(token)
+        if entry is None or entry['expires'] < time.time() or not os.path.exists(entry['path']):
+            self.send_error(404, 'File not found or link expired')
+            return
+
+        with open(entry['path'], 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            start, end = 0, file_size - 1
+            range_header = self.headers.get('Range')
+            if range_header and file_size > 0:
+                byte_range = _parse_range(range_header, file_size)
+                if byte_range is None:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{file_size}')
+                    self.end_headers()
+                    return
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+            else:
+                self.send_response(200)
+
+            length = end - start + 1 if file_size > 0 else 0
+            self.send_header('Content-Type', entry['mime'])
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Disposition',
+                             f"attachment; filename*=UTF-8''{quote(entry['filename'])}")
+            self.end_headers()
+
+            if send_body and length:
+                self._send_file(f, start, length)
+
+    def _send_file(self, f, offset, length):
+        try:
+            if hasattr(os, 'sendfile'):
+                # 内核直接从文件拷贝到套接字，不经过用户态内存
+                while length > 0:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), offset, min(length, CHUNK_SIZE * 8))
+                    if sent == 0:
+                        break
+                    offset += sent
+                    length -= sent
+            else:
+                f.seek(offset)
+                while length > 0:
+                    chunk = f.read(min(length, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    length -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # 浏览器取消下载
+            pass
+
+def _cleanup_expired():
+    """删除过期的链接，以及发布时标记为过期后删除的文件"""
+    now = time.time()
+    with _files_lock:
+        expired = [token for token, entry in _files.items() if entry['expires'] < now]
+        entries = [_files.pop(token) for token in expired]
+    for entry in entries:
+        if entry['delete_on_expire'] and os.path.exists(entry['path']):
+            try:
+                os.remove(entry['path'])
+            except OSError:
+                pass
+
+def _cleanup_loop(interval=60):
+    while True:
+        time.sleep(interval)
+        _cleanup_expired()
+
+def start_file_server(host=FILE_SERVER_HOST, port=FILE_SERVER_PORT):
+    """
+    启动文件服务（进程内只启动一次）
+
+    Args:
+        host: 监听地址
+        port: 监听端口
+
+    Returns:
+        ThreadingHTTPServer 实例；无法监听时返回 None，之后不再重试
+    """
+    global _server, _server_error
+    with _server_lock:
+        if _server is None and _server_error is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _FileHandler)
+            except OSError as e:
+                if FILE_SERVER_URL is not None:
+                    _server_error = e
+                    print(f"文件服务启动失败 ({host}:{port}): {str(e)}")
+                    return None
+                # 未配置对外地址时链接只在本机使用，端口被占用（例如另一个工具的文件服务）时改用系统分配的端口
+                try:
+                    _server = ThreadingHTTPServer((host, 0), _FileHandler)
+                except OSError as e:
+                    _server_error = e
+                    print(f"文件服务启动失败 ({host}:{port}): {str(e)}")
+                    return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            threading.Thread(target=_cleanup_loop, daemon=True).start()
+        return _server
+
+def _hostname(client_host):
+    """从浏览器请求的 Host 中去掉端口"""
+    if client_host.startswith('['):
+        # IPv6 地址形如 [::1]:8501
+        return client_host[1:].split(']', 1)[0]
+    return client_host.rsplit(':', 1)[0] if client_host.count(':') == 1 else client_host
+
+def _is_local(client_host):
+    """根据浏览器请求的 Host 判断页面是否在本机打开"""
+    return not client_host or _hostname(client_host) in LOCAL_HOSTS
+
+def _base_url(client_host):
+    """
+    返回浏览器访问文件服务使用的地址
+
+    优先使用 VIDEO_FILE_SERVER_URL；文件服务监听在非本机地址时，使用浏览器打开页面时的主机名和文件服务端口，
+    远程浏览器同样可以直接下载；否则只能从本机访问，远程浏览器抛出异常
+    """
+    if FILE_SERVER_URL is not None:
+        return FILE_SERVER_URL
+    port = _server.server_address[1]
+    if _is_local(client_host):
+        return f'http://localhost:{port}'
+    if FILE_SERVER_HOST in LOCAL_HOSTS:
+        raise Exception(
+            "文件服务只监听本机，远程浏览器无法下载。请将 VIDEO_FILE_SERVER_HOST 设置为可访问的地址（如 0.0.0.0），"
+            "或通过反向代理对外提供并设置 VIDEO_FILE_SERVER_URL"
+        )
+    hostname = _hostname(client_host)
+    return f"http://{f'[{hostname}]' if ':' in hostname else hostname}:{port}"
+
+def publish_file(path, filename=None, mime=None, ttl=FILE_TTL, delete_on_expire=True, client_host=None):
+    """
+    发布文件并返回下载链接，文件直接从磁盘分块发送，内存占用与文件大小无关
+
+    Args:
+        path: 文件路径
+        filename: 浏览器保存时使用的文件名 (默认: 原文件名)
+        mime: MIME 类型 (默认: 根据文件名推断)
+        ttl: 链接有效期(秒)
+        delete_on_expire: 链接过期后是否删除文件
+        client_host: 浏览器打开页面时使用的 Host，用于生成浏览器能访问的链接 (默认: 视为本机)
+
+    Returns:
+        下载链接；文件服务无法启动，或远程浏览器无法访问文件服务时抛出异常，异常信息说明需要的配置。
+        不会退回到把整个文件读入内存的页面内下载
+    """
+    if start_file_server() is None:
+        raise Exception(f"文件服务启动失败: {str(_server_error)}，请检查 VIDEO_FILE_SERVER_HOST 和 VIDEO_FILE_SERVER_PORT")
+    base_url = _base_url(client_host)
+    filename = filename or os.path.basename(path)
+    token = secrets.token_urlsafe(16)
+    with _files_lock:
+        _files[token] = {
+            'path': str(path),
+            'filename': filename,
+            'mime': mime or mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            'expires': time.time() + ttl,
+            'delete_on_expire': delete_on_expire
+        }
+    return f"{base_url.rstrip('/')}/{token}/{quote(filename)}"
@@ -0,0 +1,220 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# 临时空间根目录、容量上限(字节)和最长保留时间(秒)，可通过环境变量修改
+SCRATCH_ROOT = Path(os.environ.get('ADVTOOLS_SCRATCH_DIR', Path(tempfile.gettempdir()) / 'advtools_scratch'))
+SCRATCH_QUOTA_BYTES = int(os.environ.get('ADVTOOLS_SCRATCH_QUOTA_BYTES', 10 * 1024 ** 3))
+SCRATCH_MAX_AGE = int(os.environ.get('ADVTOOLS_SCRATCH_MAX_AGE', 6 * 3600))
+
+# 两次自动淘汰之间的最小间隔(秒)
+EVICT_INTERVAL = 60
+
+MARKER_NAME = '.scratch_job'
+
+_lock = threading.Lock()
+_started = False
+_last_evict = 0.0
+
+def _write_marker(path, state, created=None):
+    marker = {'pid': os.getpid(), 'created': created or time.time(), 'state': state}
+    with open(path / MARKER_NAME, 'w', encoding='utf-8') as f:
+        json.dump(marker, f)
+
+def _read_marker(path):
+    try:
+        with open(path / MARKER_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _pid_alive(pid):
+    """判断进程是否存在；Windows 上 os.kill 会结束进程，只能视为存活，交给按时间淘汰处理"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def dir_size(path):
+    """统计目录下所有文件的大小(字节)"""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _jobs():
+    """返回所有任务目录的 (路径, 标记信息)，标记缺失时按目录修改时间补全"""
+    jobs = []
+    if not SCRATCH_ROOT.exists():
+        return jobs
+    for entry in os.scandir(SCRATCH_ROOT):
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        path = Path(entry.path)
+        marker = _read_marker(path)
+        if marker is None:
+            try:
+                marker = {'pid': None, 'created': entry.stat().st_mtime, 'state': 'unknown'}
+            except FileNotFoundError:
+                # 其他线程刚刚删除了该目录
+                continue
+        jobs.append((path, marker))
+    return jobs
+
+def usage():
+    """
+    统计临时空间使用情况
+
+    Returns:
+        包含 total_bytes、jobs、active_jobs、quota_bytes 的字典
+    """
+    jobs = _jobs()
+    return {
+        'total_bytes': sum(dir_size(path) for path, _ in jobs),
+        'jobs': len(jobs),
+        'active_jobs': sum(1 for _, marker in jobs if marker['state'] == 'active'),
+        'quota_bytes': SCRATCH_QUOTA_BYTES
+    }
+
+def _evictable(marker, now, max_age):
+    """进行中且所属进程仍存活的目录不会被删除"""
+    owner_dead = marker['pid'] is None or not _pid_alive(marker['pid'])
+    if marker['state'] == 'active':
+        return owner_dead
+    return owner_dead or now - marker['created'] > max_age
+
+def cleanup_stale():
+    """
+    清理崩溃或被强制结束的进程遗留的任务目录
+
+    Returns:
+        删除的目录数量
+    """
+    removed = 0
+    for path, marker in _jobs():
+        if marker['pid'] is None or not _pid_alive(marker['pid']):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+def evict(quota=SCRATCH_QUOTA_BYTES, max_age=SCRATCH_MAX_AGE, reserve=0, keep=()):
+    """
+    删除过期目录，超出容量上限时再按创建时间从旧到新删除已完成的目录
+
+    Args:
+        quota: 容量上限(字节)
+        max_age: 已完成目录的最长保留时间(秒)
+        reserve: 需要额外预留的空间(字节)
+        keep: 不允许删除的目录（例如刚完成、即将交给调用方的目录）
+
+    Returns:
+        删除后的占用空间(字节)
+    """
+    now = time.time()
+    keep = {Path(p) for p in keep}
+    remaining = []
+    for path, marker in _jobs():
+        if path not in keep and now - marker['created'] > max_age and _evictable(marker, now, max_age):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            remaining.append((path, marker, dir_size(path)))
+
+    total = sum(size for _, _, size in remaining)
+    remaining.sort(key=lambda job: job[1]['created'])
+    for path, marker, size in remaining:
+        if total + reserve <= quota:
+            break
+        if path in keep:
+            continue
+        if marker['state'] != 'active' or _evictable(marker, now, max_age):
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+    return total
+
+def maintain(reserve=0):
+    """
+    进程内首次调用时清理遗留目录，之后按间隔淘汰过期目录
+
+    应用启动时调用一次，服务重启后即可清理上次崩溃遗留的目录，不必等到第一个任务
+
+    Args:
+        reserve: 需要额外预留的空间(字节)，超出上限时抛出异常
+    """
+    global _started, _last_evict
+    with _lock:
+        if not _started:
+            SCRATCH_ROOT.mkdir(parents=True, exist_ok=True)
+            cleanup_stale()
+            _started = True
+        if reserve > SCRATCH_QUOTA_BYTES:
+            raise Exception(f"预计占用 {reserve / 1024 ** 2:.0f}MB 超过临时空间上限 {SCRATCH_QUOTA_BYTES / 1024 ** 2:.0f}MB")
+        if reserve or time.time() - _last_evict >= EVICT_INTERVAL:
+            total = evict(reserve=reserve)
+            _last_evict = time.time()
+            if total + reserve > SCRATCH_QUOTA_BYTES:
+                raise Exception(
+                    f"临时空间不足: 已使用 {total / 1024 ** 2:.0f}MB，上限 {SCRATCH_QUOTA_BYTES / 1024 ** 2:.0f}MB"
+                )
+
+def create_job_dir(prefix='job', reserve=0):
+    """
+    创建任务专用的临时目录
+
+    Args:
+        prefix: 目录名前缀
+        reserve: 预计写入的大小(字节)，空间不足时先淘汰旧目录，仍不足则抛出异常
+
+    Returns:
+        目录路径
+    """
+    maintain(reserve)
+    path = SCRATCH_ROOT / f'{prefix}-{uuid.uuid4().hex}'
+    path.mkdir(parents=True)
+    _write_marker(path, 'active')
+    return path
+
+def mark_done(path):
+    """标记任务已完成：目录保留给调用方继续使用，之后可按时间或容量被淘汰"""
+    path = Path(path)
+    marker = _read_marker(path)
+    if marker is not None:
+        _write_marker(path, 'done', marker['created'])
+    # 任务完成时占用已确定，此时检查容量上限，淘汰更早完成的目录
+    with _lock:
+        evict(keep=[path])
+
+def release_job_dir(path):
+    """立即删除任务目录"""
+    shutil.rmtree(path, ignore_errors=True)
+
+@contextmanager
+def job_dir(prefix='job', reserve=0):
+    """
+    在 with 语句内使用的临时目录，退出时（包括出错时）自动删除
+
+    Args:
+        prefix: 目录名前缀
+        reserve: 预计写入的大小(字节)
+    """
+    path = create_job_dir(prefix, reserve)
+    try:
+        yield path
+    finally:
+        release_job_dir(path)
@@ -1,6 +1,14 @@
 import streamlit as st
-from video_downloader import download_video, get_video_info, get_thumbnail
-import os
+from video_downloader import (get_video_info, get_thumbnail, compare_profiles, check_ffmpeg,
+                              DOWNLOAD_PROFILES, DEFAULT_PROFILE)
+from common.file_server import publish_file
+from download_cache import is_cached, maintain as maintain_cache
+from batch_downloader import expand_urls, DEFAULT_WORKERS, DEFAULT_RETRIES, MAX_DOWNLOAD_WORKERS
+from common.scratch_space import maintain as maintain_scratch
+from job_runner import submit_download, submit_batch, get_batch, list_jobs, cancel_job, FINISHED_STATUSES
+
+# 下载任务列表的刷新间隔(秒)
+JOB_POLL_INTERVAL = 1
 
 def set_page_config():
     st.set_page_config(
@@ -26,8 +34,99 @@ def set_page_config():
         </style>
     """, unsafe_allow_html=True)
 
+def _job_file(job):
+    """返回任务结果的 (保存文件名, MIME 类型)"""
+    output_format = job['options'].get('output_format', 'mp4')
+    name = job['label'] if job['label'] != job['url'] else 'video_' + job['id']
+    return f"{name}.{output_format}", f"video/{output_format}"
+
+def _job_link(job):
+    """为完成的任务发布一次下载链接，之后页面重跑时复用；返回 (链接, 错误信息)"""
+    links = st.session_state.setdefault('job_links', {})
+    if job['id'] not in links:
+        filename, mime = _job_file(job)
+        try:
+            links[job['id']] = (publish_file(
+                job['path'],
+                filename=filename,
+                mime=mime,
+                delete_on_expire=not is_cached(job['path']),
+                client_host=st.context.headers.get('Host')
+            ), None)
+        except Exception as e:
+            links[job['id']] = (None, str(e))
+    return links[job['id']]
+
+def _has_active(jobs):
+    return any(job['status'] not in FINISHED_STATUSES for job in jobs)
+
+def show_batches():
+    """显示本会话每个批次的完成情况和整体速度，速度由各任务已下载的字节数和批次耗时计算"""
+    for batch_id in reversed(st.session_state.get('batch_ids', [])):
+        batch = get_batch(batch_id)
+        if batch is None or batch['summary'] is None:
+            continue
+        summary = batch['summary']
+        done = summary['completed'] + summary['failed'] + summary['cancelled']
+        st.progress(done / max(summary['total'], 1))
+        st.caption(
+            f"批量任务{'已结束' if batch['finished'] else '进行中'}（同时下载 {batch['max_workers']} 个）：完成 "
+            f"{summary['completed']}/{summary['total']}，失败 {summary['failed']}，"
+            f"共 {summary['downloaded_bytes'] / (1024 * 1024):.1f} MB，用时 {summary['elapsed']:.0f}秒，"
+            f"整体速度 {summary['throughput_mbps']:.2f} MB/s"
+        )
+
+def show_jobs(polling):
+    """
+    刷新任务列表，不重跑整个页面；任务在后台线程中运行，刷新或离开页面不会中断下载
+
+    只有存在未结束的任务时才定时刷新（polling），全部结束后重跑一次页面以停止定时刷新
+    """
+    jobs = list_jobs(st.session_state.get('job_ids', []))
+    if polling and not _has_active(jobs):
+        st.rerun()
+    if not jobs:
+        st.caption("暂无下载任务")
+        return
+    
+    show_batches()
+    for job in reversed(jobs):
+        with st.container(border=True):
+            info_col, action_col = st.columns([3, 1])
+            with info_col:
+                st.markdown(f"**{job['label']}** · {job['status']}")
+                if job['total_bytes']:
+                    st.progress(min(job['downloaded_bytes'] / job['total_bytes'], 1.0))
+                if job['status'] not in FINISHED_STATUSES:
+                    eta = f"{job['eta']}秒" if job['eta'] is not None else '-'
+                    st.caption(
+                        f"{job['downloaded_bytes'] / (1024 * 1024):.1f} / {job['total_bytes'] / (1024 * 1024):.1f} MB · "
+                        f"{(job['speed'] or 0) / (1024 * 1024):.2f} MB/s · 剩余 {eta}"
+                    )
+                elif job['status'] == '失败':
+                    st.error(f"❌ 下载失败: {job['error']}")
+            with action_col:
+                if job['status'] == '完成':
+                    # 发布到文件服务：浏览器直接从磁盘分块下载，支持断点续传，
+                    # 不再把整个视频读入内存；链接过期后自动清理临时文件，缓存文件保留
+                    link, error = _job_link(job)
+                    if link:
+                        st.link_button("点击保存视频", link, use_container_width=True)
+                    else:
+                        # 不退回页面内下载：download_button 会把整个视频读入内存
+                        st.warning(f"无法生成下载链接: {error}")
+                elif job['status'] not in FINISHED_STATUSES:
+                    st.button("取消", key=f"cancel_{job['id']}", on_click=cancel_job, args=(job['id'],),
+                              use_container_width=True)
+
 def main():
     set_page_config()
+    # 启动时清理遗留的临时目录和过期的 partial 目录，之后按间隔检查容量
+    maintain_cache()
+    try:
+        maintain_scratch()
+    except Exception as e:
+        st.warning(str(e))
     
     # 页面标题
     st.title("🎥 视频下载助手")
@@ -55,6 +154,13 @@ def main():
             )
             
             download_audio = st.checkbox("同时下载音频", value=True)
+            
+            profile = st.selectbox(
+                "下载性能配置",
+                options=list(DOWNLOAD_PROFILES),
+                index=list(DOWNLOAD_PROFILES).index(DEFAULT_PROFILE),
+                help="高速：HLS/DASH 多分片并发下载；节流：每个下载任务限速，避免占满带宽。所有配置均支持断点续传"
+            )
     
     if video_url:
         try:
@@ -79,46 +185,83 @@ def main():
             # 下载区域
             st.markdown("---")
             st.markdown("### 📥 下载区域")
-            download_col1, download_col2 = st.columns(2)
+            if st.button("开始下载", key="download_btn"):
+                # ffmpeg 提示只能在页面线程中显示，提交后台任务前检查
+                check_ffmpeg()
+                # 提交为后台任务立即返回，页面可以继续操作；下载进度在下方任务列表中实时刷新
+                job_id = submit_download(
+                    video_url,
+                    label=info['title'],
+                    output_format=output_format,
+                    quality=quality,
+                    include_audio=download_audio,
+                    profile=profile
+                )
+                st.session_state.setdefault('job_ids', []).append(job_id)
+                st.success("✅ 已加入下载队列")
             
-            with download_col1:
-                if st.button("开始下载", key="download_btn"):
-                    with st.spinner("正在下载视频..."):
+            with st.expander("📊 下载配置测速对比"):
+                st.caption("用每个配置完整下载一次当前视频（不使用缓存），比较实际下载速度")
+                if st.button("开始测速", key="measure_btn"):
+                    check_ffmpeg()
+                    with st.spinner("正在测速..."):
                         try:
-                            # 设置下载参数
-                            download_opts = {
-                                'output_format': output_format,
-                                'quality': quality,
-                                'include_audio': download_audio
-                            }
-                            
-                            # 下载视频
-                            video_path = download_video(video_url, **download_opts)
-                            
-                            # 读取视频文件
-                            with open(video_path, 'rb') as file:
-                                video_bytes = file.read()
-                            
-                            with download_col2:
-                                # 提供下载按钮
-                                st.download_button(
-                                    label="点击保存视频",
-                                    data=video_bytes,
-                                    file_name=f"{info['title']}.{output_format}",
-                                    mime=f"video/{output_format}",
-                                    key="save_btn"
-                                )
-                            
-                            # 清理临时文件
-                            os.remove(video_path)
-                            st.success("✅ 视频下载完成！")
-                            
+                            results = compare_profiles(
+                                video_url,
+                                output_format=output_format,
+                                quality=quality,
+                                include_audio=download_audio
+                            )
+                            st.dataframe([{
+                                '配置': result['profile'],
+                                '大小(MB)': f"{result['bytes'] / (1024 * 1024):.2f}",
+                                '耗时(秒)': f"{result['seconds']:.2f}",
+                                '速度(MB/s)': f"{result['mbps']:.2f}"
+                            } for result in results], use_container_width=True)
                         except Exception as e:
-                            st.error(f"❌ 下载失败: {str(e)}")
+                            st.error(f"❌ 测速失败: {str(e)}")
                         
         except Exception as e:
             st.error(f"❌ 获取视频信息失败: {str(e)}")
     
+    # 批量下载区域
+    st.markdown("---")
+    st.markdown("### 📦 批量下载")
+    with st.expander("批量下载多个视频或播放列表（使用上方的下载选项）"):
+        batch_urls = st.text_area("每行一个视频或播放列表URL", height=150)
+        batch_col1, batch_col2 = st.columns(2)
+        with batch_col1:
+            max_workers = st.slider("同时下载数", min_value=1, max_value=MAX_DOWNLOAD_WORKERS,
+                                    value=min(DEFAULT_WORKERS, MAX_DOWNLOAD_WORKERS))
+        with batch_col2:
+            retries = st.slider("失败重试次数", min_value=0, max_value=5, value=DEFAULT_RETRIES)
+        
+        urls = [line.strip() for line in batch_urls.splitlines() if line.strip()]
+        if st.button("开始批量下载", key="batch_btn", disabled=not urls):
+            check_ffmpeg()
+            with st.spinner("正在解析播放列表..."):
+                video_urls = expand_urls(urls)
+            # 批次任务提交到共享线程池，同时下载数只限制本批次，所有下载合计不超过 MAX_DOWNLOAD_WORKERS
+            batch_id, job_ids = submit_batch(
+                video_urls,
+                max_workers=max_workers,
+                retries=retries,
+                output_format=output_format,
+                quality=quality,
+                include_audio=download_audio,
+                profile=profile
+            )
+            st.session_state.setdefault('batch_ids', []).append(batch_id)
+            st.session_state.setdefault('job_ids', []).extend(job_ids)
+            st.success(f"✅ 已加入 {len(video_urls)} 个下载任务")
+    
+    # 下载任务区域
+    st.markdown("---")
+    st.markdown("### 📋 下载任务")
+    # 没有进行中的任务时不定时刷新，空闲页面不会每秒重跑
+    polling = _has_active(list_jobs(st.session_state.get('job_ids', [])))
+    st.fragment(show_jobs, run_every=JOB_POLL_INTERVAL if polling else None)(polling)
+    
     # 添加页脚
     st.markdown("---")
     st.markdown(
@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import yt_dlp
+import streamlit as st
+from video_downloader import download_video
+
+# 批量下载的默认并发数和重试策略
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 2.0
+
+# 整个进程同时下载的任务数上限：单个下载和所有批次共用同一个线程池，批次的并发数只能在此范围内
+MAX_DOWNLOAD_WORKERS = int(os.environ.get('VIDEO_MAX_DOWNLOAD_WORKERS', 8))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """返回进程内共享的下载线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS, thread_name_prefix='video-download')
+        return _executor
+
+@st.cache_data(ttl=600, max_entries=64, show_spinner=False)
+def expand_playlist(url):
+    """
+    展开播放列表（只解析列表，不解析每个视频），普通视频URL原样返回
+    
+    Args:
+        url: 视频或播放列表URL
+    
+    Returns:
+        视频URL列表
+    """
+    try:
+        with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': 'in_playlist'}) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise Exception(f"解析播放列表时出错: {str(e)}")
+    
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        return [url]
+    urls = []
+    for entry in info.get('entries') or []:
+        entry_url = entry.get('webpage_url') or entry.get('url')
+        if entry_url:
+            urls.append(entry_url)
+    return urls
+
+def expand_urls(urls, max_workers=DEFAULT_WORKERS):
+    """
+    并发展开多个视频或播放列表URL，去重后保持原有顺序
+    
+    解析失败的URL保留原样，交给下载任务重试并记录错误
+    
+    Returns:
+        视频URL列表
+    """
+    def expand(url):
+        try:
+            return expand_playlist(url)
+        except Exception:
+            return [url]
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        video_urls = [video_url for expanded in executor.map(expand, urls) for video_url in expanded]
+    return list(dict.fromkeys(video_urls))
+
+def new_job(url):
+    """创建下载任务的状态字典"""
+    return {
+        'url': url,
+        'status': '等待中',
+        'attempts': 0,
+        'downloaded_bytes': 0,
+        'total_bytes': 0,
+        'speed': 0,
+        'eta': None,
+        'path': None,
+        'error': None,
+        'cancelled': False,
+        '_cancel_event': threading.Event(),
+        '_files': {},
+        '_totals': {}
+    }
+
+def _progress_hook(job):
+    """把 yt-dlp 的进度回调写入任务状态；合并音视频时会依次下载多个文件，按文件分别累计"""
+    def hook(d):
+        if job['cancelled']:
+            raise yt_dlp.utils.DownloadCancelled('任务已取消')
+        filename = d.get('filename', '')
+        if d['status'] == 'downloading':
+            job['status'] = '下载中'
+            job['_files'][filename] = d.get('downloaded_bytes') or 0
+            job['_totals'][filename] = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            job['speed'] = d.get('speed') or 0
+            job['eta'] = d.get('eta')
+        elif d['status'] == 'finished':
+            job['_files'][filename] = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            job['_totals'][filename] = job['_files'][filename]
+        job['downloaded_bytes'] = sum(job['_files'].values())
+        job['total_bytes'] = sum(job['_totals'].values())
+    return hook
+
+def cancel(job):
+    """取消任务：等待中的任务不再开始，重试等待立即结束，下载中的任务在下一次进度回调时停止"""
+    job['cancelled'] = True
+    job['_cancel_event'].set()
+
+def run_job(job, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, download_opts=None):
+    """执行单个下载任务，失败后按指数退避重试；job['cancelled'] 置为 True 后在下一次进度回调时停止"""
+    download_opts = download_opts or {}
+    job['started'] = time.time()
+    for attempt in range(1, retries + 2):
+        if job['cancelled']:
+            job['status'] = '已取消'
+            break
+        job['attempts'] = attempt
+        job['_files'], job['_totals'] = {}, {}
+        try:
+            job['path'] = download_video(job['url'], progress_hooks=[_progress_hook(job)],
+                                         cancel_event=job['_cancel_event'], **download_opts)
+            job['status'] = '完成'
+            job['error'] = None
+            break
+        except Exception as e:
+            if job['cancelled']:
+                job['status'] = '已取消'
+                break
+            job['error'] = str(e)
+            if attempt > retries:
+                job['status'] = '失败'
+                break
+            job['status'] = f'重试中 ({attempt}/{retries})'
+            # 等待期间取消时立即结束，不必等完退避时间
+            if job['_cancel_event'].wait(backoff * 2 ** (attempt - 1)):
+                job['status'] = '已取消'
+                break
+    job['finished'] = time.time()
+    return job
+
+def summarize(jobs, started):
+    """统计批量任务的完成情况和整体吞吐量"""
+    elapsed = max(time.time() - started, 1e-6)
+    downloaded = sum(job['downloaded_bytes'] for job in jobs)
+    return {
+        'total': len(jobs),
+        'completed': sum(job['status'] == '完成' for job in jobs),
+        'failed': sum(job['status'] == '失败' for job in jobs),
+        'cancelled': sum(job['status'] == '已取消' for job in jobs),
+        'downloaded_bytes': downloaded,
+        'elapsed': elapsed,
+        'throughput_mbps': downloaded / elapsed / (1024 * 1024)
+    }
+
+def run_batch(jobs, max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+              on_update=None, update_interval=0.5, download_opts=None):
+    """
+    在共享的下载线程池中执行一组下载任务，阻塞到全部结束
+    
+    本批次同时提交到线程池的任务不超过 max_workers 个，所有批次和单个下载合计不超过 MAX_DOWNLOAD_WORKERS 个
+    
+    Args:
+        jobs: new_job 创建的任务状态列表
+        max_workers: 本批次同时下载的任务数 (默认: 4)
+        retries: 每个任务失败后的重试次数 (默认: 3)
+        backoff: 首次重试前的等待秒数，之后每次翻倍 (默认: 2.0)
+        on_update: 在调用线程中定期调用 on_update(jobs, summary)，用于刷新界面或记录进度
+        update_interval: 刷新间隔秒数 (默认: 0.5)
+        download_opts: 传给 download_video 的参数（output_format、quality、include_audio、profile）
+    
+    Returns:
+        (jobs, summary)：每个任务的状态列表和整体统计
+    """
+    started = time.time()
+    executor = get_executor()
+    queued = iter(jobs)
+    pending = set()
+    while True:
+        # 有任务结束时补充提交，本批次占用的线程数保持在 max_workers 以内
+        while len(pending) < max_workers:
+            job = next(queued, None)
+            if job is None:
+                break
+            pending.add(executor.submit(run_job, job, retries, backoff, download_opts))
+        if not pending:
+            break
+        _, pending = wait(pending, timeout=update_interval)
+        if on_update:
+            on_update(jobs, summarize(jobs, started))
+    
+    return jobs, summarize(jobs, started)
@@ -0,0 +1,251 @@
+import argparse
+import contextlib
+import functools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import yt_dlp
+import download_cache
+from video_downloader import download_video, get_video_info, extract_metadata, DOWNLOAD_PROFILES, DEFAULT_PROFILE
+
+from common import scratch_space
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_CONCURRENCY = [1, 2, 4, 8]
+DEFAULT_MEDIA = ['mp4', 'hls']
+
+# 资源占用的采样间隔(秒)
+SAMPLE_INTERVAL = 0.05
+
+def make_media(root, size_mb=8, segments=20):
+    """
+    生成合成测试媒体：一个完整的 MP4 文件和一个分片 HLS 播放列表
+
+    内容为随机字节，只用于测量传输和落盘开销，yt-dlp 的通用提取器和原生 HLS 下载器不会解码内容
+
+    Returns:
+        {媒体类型: 相对路径}
+    """
+    root = Path(root)
+    payload = os.urandom(size_mb * 1024 * 1024)
+    (root / 'progressive.mp4').write_bytes(payload)
+
+    hls_dir = root / 'hls'
+    hls_dir.mkdir(exist_ok=True)
+    segment_size = len(payload) // segments
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+    for i in range(segments):
+        (hls_dir / f'segment{i}.ts').write_bytes(payload[i * segment_size:(i + 1) * segment_size])
+        lines += ['#EXTINF:2.0,', f'segment{i}.ts']
+    lines.append('#EXT-X-ENDLIST')
+    (hls_dir / 'index.m3u8').write_text('\n'.join(lines) + '\n')
+    return {'mp4': 'progressive.mp4', 'hls': 'hls/index.m3u8'}
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map,
+                      '.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t'}
+
+    def log_message(self, format, *args):
+        pass
+
+    def copyfile(self, source, outputfile):
+        try:
+            super().copyfile(source, outputfile)
+        except (BrokenPipeError, ConnectionResetError):
+            # yt-dlp 探测文件类型时只读取开头部分就断开连接
+            pass
+
+def start_media_server(root):
+    """在随机端口启动本地媒体服务，返回 (server, base_url)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=str(root)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+class _ResourceSampler:
+    """后台采样进程内存和临时目录占用的峰值"""
+
+    def __init__(self, dirs):
+        self.dirs = dirs
+        self.peak_rss = 0
+        self.peak_disk = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        if psutil is not None:
+            self.peak_rss = max(self.peak_rss, psutil.Process().memory_info().rss)
+        self.peak_disk = max(self.peak_disk, sum(scratch_space.dir_size(d) for d in self.dirs))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(SAMPLE_INTERVAL)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if psutil is None and resource is not None:
+            # 没有 psutil 时退回进程启动以来的峰值；Linux 单位为 KB，macOS 为字节
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak_rss = maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def _percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+def _run_one(url, use_cache, profile):
+    """提取信息并下载一次，返回 (信息耗时, 下载耗时, 文件大小)"""
+    start = time.perf_counter()
+    get_video_info(url)
+    info_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    path = download_video(url, use_cache=use_cache, profile=profile)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(path)
+    if not download_cache.is_cached(path):
+        scratch_space.release_job_dir(Path(path).parent)
+    return info_seconds, seconds, size
+
+def run_level(url, concurrency, jobs_per_level, use_cache=False, profile=DEFAULT_PROFILE, run_id=0):
+    """
+    以指定并发数运行一组下载
+
+    Returns:
+        包含延迟分位数、吞吐量、峰值内存和峰值临时空间的字典
+    """
+    # 每个任务使用不同的查询参数，避免元数据缓存和下载缓存把并发请求合并成一次
+    urls = [f'{url}?run={run_id}&job={i}' for i in range(jobs_per_level)]
+    dirs = [scratch_space.SCRATCH_ROOT, download_cache.CACHE_DIR]
+    start = time.perf_counter()
+    with _ResourceSampler(dirs) as sampler, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job_url: _run_one(job_url, use_cache, profile), urls))
+    elapsed = time.perf_counter() - start
+
+    info_latencies = sorted(result[0] for result in results)
+    latencies = sorted(result[1] for result in results)
+    total_bytes = sum(result[2] for result in results)
+    return {
+        'concurrency': concurrency,
+        'jobs': jobs_per_level,
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'throughput_mbps': total_bytes / elapsed / (1024 * 1024),
+        'info_latency_p50': _percentile(info_latencies, 50),
+        'latency_p50': _percentile(latencies, 50),
+        'latency_p95': _percentile(latencies, 95),
+        'latency_max': latencies[-1],
+        'peak_rss_mb': sampler.peak_rss / (1024 * 1024),
+        'peak_temp_mb': sampler.peak_disk / (1024 * 1024)
+    }
+
+def run_benchmarks(media=DEFAULT_MEDIA, concurrency=DEFAULT_CONCURRENCY, jobs_per_level=8, size_mb=8,
+                   segments=20, use_cache=False, profile=DEFAULT_PROFILE, log=print):
+    """
+    启动本地媒体服务并在各并发级别下运行下载基准测试，不需要访问外网
+
+    临时空间和下载缓存重定向到独立的临时目录，测试结束后删除
+
+    Args:
+        media: 媒体类型列表（mp4: 完整文件，hls: 分片播放列表）
+        concurrency: 并发数列表
+        jobs_per_level: 每个并发级别的下载次数
+        size_mb: 合成媒体大小(MB)
+        segments: HLS 分片数
+        use_cache: 是否经过下载缓存
+        profile: 下载性能配置
+        log: 每完成一组时调用的输出函数
+
+    Returns:
+        每个 (媒体类型, 并发数) 的结果列表
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix='advtools_download_bench_'))
+    saved = scratch_space.SCRATCH_ROOT, download_cache.CACHE_DIR
+    scratch_space.SCRATCH_ROOT = work_dir / 'scratch'
+    download_cache.CACHE_DIR = work_dir / 'cache'
+    server = None
+    try:
+        media_root = work_dir / 'media'
+        media_root.mkdir()
+        paths = make_media(media_root, size_mb, segments)
+        server, base_url = start_media_server(media_root)
+
+        results = []
+        run_id = 0
+        for media_type in media:
+            for level in concurrency:
+                run_id += 1
+                # yt-dlp 的进度输出会淹没结果，测试期间丢弃标准输出
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    result = run_level(f'{base_url}/{paths[media_type]}', level, jobs_per_level,
+                                       use_cache, profile, run_id)
+                extract_metadata.clear()
+                result['media'] = media_type
+                results.append(result)
+                log(f"{media_type:<4} 并发 {level:>3}  {result['throughput_mbps']:>9.2f} MB/s  "
+                    f"延迟 p50 {result['latency_p50'] * 1000:>8.1f} ms  p95 {result['latency_p95'] * 1000:>8.1f} ms  "
+                    f"信息 p50 {result['info_latency_p50'] * 1000:>7.1f} ms  "
+                    f"内存峰值 {result['peak_rss_mb']:>7.1f} MB  临时空间峰值 {result['peak_temp_mb']:>8.1f} MB")
+        return results
+    finally:
+        if server is not None:
+            server.shutdown()
+        scratch_space.SCRATCH_ROOT, download_cache.CACHE_DIR = saved
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='离线视频下载性能基准测试')
+    parser.add_argument('--media', nargs='+', choices=DEFAULT_MEDIA, default=DEFAULT_MEDIA, help='媒体类型')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=DEFAULT_CONCURRENCY, help='并发数')
+    parser.add_argument('--jobs', type=int, default=8, help='每个并发级别的下载次数 (默认: 8)')
+    parser.add_argument('--size-mb', type=int, default=8, help='合成媒体大小 (默认: 8MB)')
+    parser.add_argument('--segments', type=int, default=20, help='HLS 分片数 (默认: 20)')
+    parser.add_argument('--profile', choices=list(DOWNLOAD_PROFILES), default=DEFAULT_PROFILE, help='下载性能配置')
+    parser.add_argument('--use-cache', action='store_true', help='经过下载缓存（默认绕过）')
+    parser.add_argument('-o', '--output', default='download_benchmark.json', help='结果 JSON 文件')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.media, args.concurrency, args.jobs, args.size_mb, args.segments,
+                             args.use_cache, args.profile)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'machine': platform.machine(),
+        'profile': args.profile,
+        'use_cache': args.use_cache,
+        'rss_source': 'psutil' if psutil is not None else 'ru_maxrss',
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
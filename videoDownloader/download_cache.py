@@ -0,0 +1,302 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# 缓存目录和容量上限，可通过环境变量修改
+CACHE_DIR = Path(os.environ.get('VIDEO_CACHE_DIR', Path(tempfile.gettempdir()) / 'advtools_video_cache'))
+CACHE_QUOTA_BYTES = int(os.environ.get('VIDEO_CACHE_QUOTA_BYTES', 20 * 1024 ** 3))
+
+# 未完成的下载保留给断点续传，超过该时间(秒)没有写入则删除
+PARTIAL_MAX_AGE = int(os.environ.get('VIDEO_CACHE_PARTIAL_MAX_AGE', 24 * 3600))
+
+# maintain 两次检查之间的最小间隔(秒)
+MAINTAIN_INTERVAL = 60
+
+LOCK_NAME = '.lock'
+
+# 等待其他请求下载同一个视频时检查取消标志的间隔(秒)
+CANCEL_POLL_INTERVAL = 0.2
+
+# 正在下载的缓存项：同一个视频的并发请求共享一次下载；跨进程的并发请求由 partial 目录中的锁文件串行化
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_quota_lock = threading.Lock()
+_last_maintain = 0.0
+
+def cache_key(extractor, video_id, format_id, output_format, include_audio):
+    """
+    由 (提取器, 视频ID, 实际选中的格式, 输出格式, 是否含音频) 计算缓存键
+
+    Returns:
+        十六进制字符串
+    """
+    raw = '\x1f'.join(str(part) for part in (extractor, video_id, format_id, output_format, include_audio))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def cache_path(key, ext):
+    """缓存文件的最终路径"""
+    return CACHE_DIR / f'{key}.{ext}'
+
+def is_cached(path):
+    """判断路径是否为缓存文件；缓存文件由容量上限统一淘汰，调用方不应删除"""
+    return Path(path).parent == CACHE_DIR
+
+def partial_dir(key):
+    """缓存项下载过程中使用的目录，发布前文件只存在于这里"""
+    return CACHE_DIR / '.partial' / key
+
+def _touch(path):
+    """命中时更新修改时间，作为 LRU 淘汰的依据"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _try_lock(f, blocking):
+    """对已打开的锁文件加排他锁，非阻塞模式下已被占用时返回 False"""
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.1)
+
+def _check_cancel(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise Exception("下载已取消")
+
+def _wait_event(event, cancel_event):
+    """等待 event，期间按间隔检查 cancel_event，被取消时抛出异常"""
+    if cancel_event is None:
+        event.wait()
+        return
+    while not event.wait(CANCEL_POLL_INTERVAL):
+        _check_cancel(cancel_event)
+
+def _lock_file(f, blocking, cancel_event):
+    """加锁；阻塞等待其他进程释放锁期间按间隔检查 cancel_event"""
+    if not blocking or cancel_event is None:
+        return _try_lock(f, blocking)
+    while not _try_lock(f, False):
+        _check_cancel(cancel_event)
+        time.sleep(CANCEL_POLL_INTERVAL)
+    return True
+
+@contextmanager
+def _partial_lock(work_dir, blocking=True, cancel_event=None):
+    """
+    持有 partial 目录的锁文件：同一个缓存项同时只有一个进程在下载或删除
+
+    非阻塞模式下锁已被占用时产出 False。目录或锁文件在等待期间被删除（下载完成或目录被淘汰）时重新加锁。
+    等待其他进程释放锁期间 cancel_event 被设置时抛出异常。
+    进程退出时操作系统自动释放锁，不会留下失效的锁。
+    """
+    while True:
+        work_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            f = open(work_dir / LOCK_NAME, 'a+')
+        except FileNotFoundError:
+            # 目录在创建后被持锁的进程删除，重新创建
+            continue
+        try:
+            if not _lock_file(f, blocking, cancel_event):
+                yield False
+                return
+            try:
+                current = os.stat(work_dir / LOCK_NAME)
+            except FileNotFoundError:
+                current = None
+            if current is not None and os.path.samestat(current, os.fstat(f.fileno())):
+                yield True
+                return
+        finally:
+            f.close()
+
+def _dir_stats(path):
+    """
+    返回目录中所有文件的 (总大小, 最近写入时间)
+
+    加锁会创建锁文件并更新目录的修改时间，因此只按下载文件的修改时间计算，没有下载文件时才使用目录本身的时间
+    """
+    total, latest = 0, None
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                stat = os.lstat(os.path.join(dirpath, name))
+            except OSError:
+                continue
+            total += stat.st_size
+            if name != LOCK_NAME:
+                latest = stat.st_mtime if latest is None else max(latest, stat.st_mtime)
+    if latest is None:
+        latest = os.stat(path).st_mtime
+    return total, latest
+
+def cache_usage():
+    """返回缓存中已发布文件的 (路径, 大小, 修改时间) 列表"""
+    entries = []
+    if not CACHE_DIR.exists():
+        return entries
+    for entry in os.scandir(CACHE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((Path(entry.path), stat.st_size, stat.st_mtime))
+    return entries
+
+def partial_usage():
+    """返回未完成下载的 (partial 目录, 大小, 最近写入时间) 列表"""
+    entries = []
+    root = CACHE_DIR / '.partial'
+    if not root.exists():
+        return entries
+    for entry in os.scandir(root):
+        if entry.is_dir(follow_symlinks=False):
+            try:
+                size, mtime = _dir_stats(entry.path)
+            except FileNotFoundError:
+                # 其他线程或进程刚刚发布或删除了该目录
+                continue
+            entries.append((Path(entry.path), size, mtime))
+    return entries
+
+def _remove_partial(path):
+    """删除没有在下载中的 partial 目录，返回是否删除"""
+    with _partial_lock(path, blocking=False) as locked:
+        if locked:
+            shutil.rmtree(path, ignore_errors=True)
+        return locked
+
+def enforce_quota(quota=CACHE_QUOTA_BYTES, keep=(), partial_max_age=PARTIAL_MAX_AGE):
+    """
+    删除长时间没有写入的未完成下载；超出容量上限时，再按最近最少使用的顺序删除缓存文件和未完成下载
+
+    Args:
+        quota: 容量上限(字节)，未完成下载也计入
+        keep: 不允许删除的路径（例如刚发布的文件）
+        partial_max_age: 未完成下载的最长保留时间(秒)
+
+    正在下载的 partial 目录（锁被其他线程或进程持有）不会被删除。
+    """
+    keep = {Path(p) for p in keep}
+    now = time.time()
+    with _quota_lock:
+        entries = cache_usage()
+        for path, size, mtime in partial_usage():
+            if now - mtime > partial_max_age and _remove_partial(path):
+                continue
+            entries.append((path, size, mtime))
+
+        entries.sort(key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= quota:
+                break
+            if path in keep:
+                continue
+            try:
+                if path.is_dir():
+                    if not _remove_partial(path):
+                        continue
+                else:
+                    path.unlink()
+                total -= size
+            except OSError:
+                pass
+
+def maintain():
+    """
+    按间隔执行 enforce_quota，供页面每次运行时调用
+
+    失败或取消的下载不会触发发布后的容量检查，服务启动时和之后每隔 MAINTAIN_INTERVAL 秒在这里清理
+    """
+    global _last_maintain
+    if time.time() - _last_maintain < MAINTAIN_INTERVAL:
+        return
+    _last_maintain = time.time()
+    enforce_quota()
+
+def get_or_download(key, ext, download_fn, cancel_event=None):
+    """
+    从缓存获取文件，不存在时下载并原子发布
+
+    Args:
+        key: cache_key 计算的缓存键
+        ext: 文件扩展名
+        download_fn: download_fn(target_path) 把文件下载到 target_path
+        cancel_event: 本次请求的取消标志 (threading.Event)；等待其他请求下载同一个视频期间被设置时抛出异常
+
+    Returns:
+        (缓存文件路径, 是否命中缓存)
+    """
+    final_path = cache_path(key, ext)
+    while True:
+        if final_path.exists():
+            _touch(final_path)
+            return final_path, True
+
+        with _in_flight_lock:
+            state = _in_flight.get(key)
+            owner = state is None
+            if owner:
+                state = {'event': threading.Event(), 'error': None, 'cancelled': False}
+                _in_flight[key] = state
+
+        if owner:
+            return _download_owned(key, ext, final_path, state, download_fn, cancel_event)
+
+        # 其他请求正在下载同一个视频，等待其完成；下载者被取消时重新尝试，可能由本请求接手下载
+        _wait_event(state['event'], cancel_event)
+        if state['cancelled']:
+            continue
+        if state['error'] is not None:
+            raise state['error']
+        _touch(final_path)
+        return final_path, True
+
+def _download_owned(key, ext, final_path, state, download_fn, cancel_event):
+    """由本请求下载缓存项，结束后通知等待同一个视频的其他请求"""
+    try:
+        work_dir = partial_dir(key)
+        with _partial_lock(work_dir, cancel_event=cancel_event):
+            # 等待锁期间其他进程可能已经下载并发布了同一个视频
+            if final_path.exists():
+                shutil.rmtree(work_dir, ignore_errors=True)
+                _touch(final_path)
+                return final_path, True
+            target = work_dir / f'video.{ext}'
+            download_fn(target)
+            # 同一文件系统内 os.replace 是原子的，读者只会看到完整文件
+            os.replace(target, final_path)
+            shutil.rmtree(work_dir, ignore_errors=True)
+        enforce_quota(keep=[final_path])
+        return final_path, False
+    except Exception as e:
+        state['error'] = e
+        state['cancelled'] = cancel_event is not None and cancel_event.is_set()
+        # 保留 partial 目录用于断点续传，同时检查容量，避免失败的下载无限累积
+        enforce_quota()
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        state['event'].set()
@@ -0,0 +1,175 @@
+import threading
+import time
+import uuid
+from batch_downloader import (new_job, run_job, run_batch, cancel, get_executor,
+                              DEFAULT_WORKERS, DEFAULT_RETRIES, DEFAULT_BACKOFF)
+
+# 已结束任务在列表中保留的时间(秒)
+JOB_RETENTION = 3600
+
+FINISHED_STATUSES = ('完成', '失败', '已取消')
+
+# 任务表属于整个服务进程：页面重跑或多个会话都能看到同一批任务；下载使用 batch_downloader 的共享线程池
+_jobs = {}
+_batches = {}
+_jobs_lock = threading.Lock()
+
+def _prune(now):
+    """删除结束时间超过保留期的任务和批次"""
+    expired = [job_id for job_id, job in _jobs.items()
+               if job['status'] in FINISHED_STATUSES and now - (job.get('finished') or now) > JOB_RETENTION]
+    for job_id in expired:
+        del _jobs[job_id]
+    expired = [batch_id for batch_id, batch in _batches.items()
+               if batch['finished'] is not None and now - batch['finished'] > JOB_RETENTION]
+    for batch_id in expired:
+        del _batches[batch_id]
+
+def _register(url, label, download_opts):
+    """创建任务并加入任务表"""
+    job = new_job(url)
+    job.update({
+        'id': uuid.uuid4().hex[:12],
+        'label': label or url,
+        'options': dict(download_opts),
+        'submitted': time.time(),
+        'started': None,
+        'finished': None
+    })
+    with _jobs_lock:
+        _prune(job['submitted'])
+        _jobs[job['id']] = job
+    return job
+
+def submit_download(url, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, label=None, **download_opts):
+    """
+    提交后台下载任务，立即返回
+
+    Args:
+        url: 视频URL
+        retries: 失败后的重试次数
+        backoff: 首次重试前的等待秒数，之后每次翻倍
+        label: 界面显示的名称 (默认: URL)
+        **download_opts: 传给 download_video 的参数（output_format、quality、include_audio、profile）
+
+    Returns:
+        任务ID
+    """
+    job = _register(url, label, download_opts)
+
+    def run():
+        try:
+            run_job(job, retries, backoff, download_opts)
+        except Exception as e:
+            job['status'] = '失败'
+            job['error'] = str(e)
+            job['finished'] = time.time()
+
+    get_executor().submit(run)
+    return job['id']
+
+def submit_batch(urls, max_workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 **download_opts):
+    """
+    提交批量下载，立即返回；批次在后台线程中向共享线程池提交任务，本批次最多同时下载 max_workers 个
+
+    Args:
+        urls: 视频URL列表（播放列表需先用 expand_urls 展开）
+        max_workers: 本批次同时下载的任务数
+        retries: 每个任务失败后的重试次数
+        backoff: 首次重试前的等待秒数，之后每次翻倍
+        **download_opts: 传给 download_video 的参数（output_format、quality、include_audio、profile）
+
+    Returns:
+        (批次ID, 任务ID列表)
+    """
+    jobs = [_register(url, None, download_opts) for url in urls]
+    batch = {
+        'id': uuid.uuid4().hex[:12],
+        'job_ids': [job['id'] for job in jobs],
+        'max_workers': max_workers,
+        'submitted': time.time(),
+        'finished': None,
+        'summary': None
+    }
+    with _jobs_lock:
+        _batches[batch['id']] = batch
+
+    def update(jobs, summary):
+        batch['summary'] = summary
+
+    def run():
+        try:
+            _, batch['summary'] = run_batch(jobs, max_workers, retries, backoff, on_update=update,
+                                            download_opts=download_opts)
+        except Exception as e:
+            for job in jobs:
+                if job['status'] not in FINISHED_STATUSES:
+                    job['status'] = '失败'
+                    job['error'] = str(e)
+                    job['finished'] = time.time()
+        batch['finished'] = time.time()
+
+    threading.Thread(target=run, name=f"video-batch-{batch['id']}", daemon=True).start()
+    return batch['id'], batch['job_ids']
+
+def get_batch(batch_id):
+    """
+    查询批次状态
+
+    Args:
+        batch_id: submit_batch 返回的批次ID
+
+    Returns:
+        批次状态字典（job_ids、max_workers、finished 以及 summarize 统计的 summary），不存在时返回None；
+        批次结束后 summary 固定为最终的整体吞吐量
+    """
+    with _jobs_lock:
+        batch = _batches.get(batch_id)
+        return dict(batch) if batch is not None else None
+
+def _public(job):
+    """返回任务状态的快照，不包含内部字段"""
+    return {key: value for key, value in job.items() if not key.startswith('_')}
+
+def get_job(job_id):
+    """
+    查询任务状态
+
+    Args:
+        job_id: submit_download 返回的任务ID
+
+    Returns:
+        任务状态字典（status、downloaded_bytes、total_bytes、speed、eta、path、error 等），不存在时返回None
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return _public(job) if job is not None else None
+
+def list_jobs(job_ids=None):
+    """
+    查询多个任务的状态
+
+    Args:
+        job_ids: 任务ID列表 (默认: 全部任务)
+
+    Returns:
+        任务状态列表，按提交时间排序；已过期清理的任务会被忽略
+    """
+    with _jobs_lock:
+        jobs = [_jobs[job_id] for job_id in job_ids if job_id in _jobs] if job_ids is not None else list(_jobs.values())
+        return sorted((_public(job) for job in jobs), key=lambda job: job['submitted'])
+
+def cancel_job(job_id):
+    """
+    取消任务：等待中的任务不再开始，重试等待中的任务立即结束，下载中的任务在下一次进度回调时停止
+
+    Returns:
+        是否找到了未结束的任务
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job['status'] in FINISHED_STATUSES:
+            return False
+        cancel(job)
+        return True
@@ -1,14 +1,24 @@
+import os
+import time
 import yt_dlp
-import tempfile
 from pathlib import Path
 import shutil
 import streamlit as st
+from download_cache import cache_key, get_or_download
+
+from common.scratch_space import create_job_dir, mark_done, release_job_dir
+
+def has_ffmpeg():
+    """检查系统是否安装了ffmpeg，不输出任何界面内容，可以在后台线程中调用"""
+    return shutil.which('ffmpeg') is not None
 
 def check_ffmpeg():
     """
-    检查系统是否安装了ffmpeg
+    检查系统是否安装了ffmpeg，未安装时在页面上提示
+
+    st.warning 只能在页面脚本所在的线程中显示，应在提交后台下载任务之前调用
     """
-    if not shutil.which('ffmpeg'):
+    if not has_ffmpeg():
         st.warning("""
         ⚠️ 未检测到ffmpeg，这可能会影响视频下载质量。
         建议安装ffmpeg:
@@ -19,28 +29,94 @@ def check_ffmpeg():
         return False
     return True
 
-def download_video(url, output_format='mp4', quality='最高质量', include_audio=True):
+# 下载性能配置：
+#   concurrent_fragment_downloads: HLS/DASH 同时下载的分片数
+#   http_chunk_size: 普通 HTTP 下载按块请求的大小(字节)，None 表示一次请求整个文件
+#   continuedl: 是否从未完成的 .part 文件继续下载
+#   ratelimit: 每个下载任务的限速(字节/秒)，批量下载时每个并发任务分别限速
+DOWNLOAD_PROFILES = {
+    '标准': {'concurrent_fragment_downloads': 1, 'http_chunk_size': None, 'continuedl': True, 'ratelimit': None},
+    '高速': {'concurrent_fragment_downloads': 8, 'http_chunk_size': 10 * 1024 * 1024, 'continuedl': True,
+             'ratelimit': None},
+    '节流': {'concurrent_fragment_downloads': 2, 'http_chunk_size': 10 * 1024 * 1024, 'continuedl': True,
+             'ratelimit': 2 * 1024 * 1024}
+}
+DEFAULT_PROFILE = '标准'
+
+def resolve_profile(profile=DEFAULT_PROFILE):
     """
-    下载视频并返回临时文件路径
+    获取下载性能配置
+    
+    Args:
+        profile: DOWNLOAD_PROFILES 中的名称，或覆盖部分选项的字典
+    
+    Returns:
+        完整的配置字典
+    """
+    if isinstance(profile, dict):
+        return {**DOWNLOAD_PROFILES[DEFAULT_PROFILE], **profile}
+    if profile not in DOWNLOAD_PROFILES:
+        raise Exception(f"未知的下载配置: {profile}")
+    return dict(DOWNLOAD_PROFILES[profile])
+
+def _download_to(url, format_spec, output_format, target_path, progress_hooks=None, profile=DEFAULT_PROFILE):
+    """按给定格式和性能配置把视频下载到 target_path"""
+    ydl_opts = {
+        'format': format_spec,
+        'outtmpl': str(target_path),
+        'merge_output_format': output_format,
+        'progress_hooks': list(progress_hooks or [])
+    }
+    ydl_opts.update({key: value for key, value in resolve_profile(profile).items() if value is not None})
+    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        try:
+            # 复用缓存的元数据（cache_data 每次返回独立副本），只在本地重新选择格式，不再重复解析页面
+            ydl.process_ie_result(extract_metadata(url), download=True)
+        except yt_dlp.utils.DownloadError:
+            # 缓存中的直链可能已失效，退回完整下载流程
+            ydl.download([url])
+
+def _resolve_cache_key(url, format_spec, output_format, include_audio):
+    """
+    在本地完成格式选择，得到下载缓存键；播放列表等无法确定单一格式时返回None
+    """
+    info = extract_metadata(url)
+    if info.get('_type', 'video') != 'video':
+        return None
+    with yt_dlp.YoutubeDL({'format': format_spec, 'quiet': True}) as ydl:
+        resolved = ydl.process_ie_result(info, download=False)
+    if not resolved.get('format_id') or not resolved.get('id'):
+        return None
+    return cache_key(
+        resolved.get('extractor_key') or resolved.get('extractor'),
+        resolved['id'],
+        resolved['format_id'],
+        output_format,
+        include_audio
+    )
+
+def download_video(url, output_format='mp4', quality='最高质量', include_audio=True, progress_hooks=None,
+                   use_cache=True, profile=DEFAULT_PROFILE, cancel_event=None):
+    """
+    下载视频并返回文件路径
     
     Args:
         url: 视频URL
         output_format: 输出格式 (默认: mp4)
         quality: 视频质量 (默认: 最高质量)
         include_audio: 是否包含音频 (默认: True)
+        progress_hooks: yt-dlp 下载进度回调列表 (默认: None)
+        use_cache: 是否使用下载缓存；命中时直接返回缓存文件，不访问网络 (默认: True)
+        profile: 下载性能配置名称或字典，见 DOWNLOAD_PROFILES (默认: 标准)；
+            使用缓存时未完成的文件保留在固定目录，失败重试会从断点继续
+        cancel_event: 取消标志 (threading.Event)；等待其他任务下载同一个视频期间被设置时停止等待 (默认: None)
     
     Returns:
-        临时文件路径
+        文件路径；使用缓存时为共享的缓存文件，调用方不应删除
     """
-    # 检查ffmpeg
-    has_ffmpeg = check_ffmpeg()
-    
-    # 创建临时目录
-    temp_dir = tempfile.mkdtemp()
-    temp_path = Path(temp_dir) / f'video.{output_format}'
-    
-    # 根据是否有ffmpeg调整format设置
-    if has_ffmpeg:
+    # 根据是否有ffmpeg调整format设置；下载通常在后台线程中执行，这里不输出界面提示
+    if has_ffmpeg():
         format_map = {
             '最高质量': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best' if include_audio else 'bestvideo[ext=mp4]',
             '中等质量': 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best' if include_audio else 'bestvideo[height<=720][ext=mp4]',
@@ -53,41 +129,117 @@ def download_video(url, output_format='mp4', quality='最高质量', include_aud
             '中等质量': 'best[height<=720]',
             '最低质量': 'worst'
         }
-    
-    # 设置下载选项
-    ydl_opts = {
-        'format': format_map.get(quality, 'best'),
-        'outtmpl': str(temp_path),
-        'merge_output_format': output_format
-    }
+    format_spec = format_map.get(quality, 'best')
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        key = _resolve_cache_key(url, format_spec, output_format, include_audio) if use_cache else None
+        if key is not None:
+            path, _ = get_or_download(
+                key, output_format,
+                lambda target: _download_to(url, format_spec, output_format, target, progress_hooks, profile),
+                cancel_event=cancel_event
+            )
+            return str(path)
+        
+        # 在受管理的临时空间中下载：失败时立即删除，成功后由容量上限和保留时间统一回收
+        job_path = create_job_dir('video')
+        temp_path = job_path / f'video.{output_format}'
+        try:
+            _download_to(url, format_spec, output_format, temp_path, progress_hooks, profile)
+        except Exception:
+            release_job_dir(job_path)
+            raise
+        mark_done(job_path)
         return str(temp_path)
     except Exception as e:
         raise Exception(f"下载视频时出错: {str(e)}")
 
-def get_video_info(url):
+def measure_download(url, profile=DEFAULT_PROFILE, **download_opts):
     """
-    获取视频信息
+    使用指定配置完整下载一次（不使用缓存），测量实际下载速度
+    
+    Args:
+        url: 视频URL
+        profile: 下载性能配置名称或字典
+        **download_opts: 传给 download_video 的其他参数（output_format、quality、include_audio）
+    
+    Returns:
+        包含 profile、bytes、seconds、mbps 的字典
+    """
+    # 先提取元数据，计时只包含下载本身
+    extract_metadata(url)
+    start = time.perf_counter()
+    path = download_video(url, use_cache=False, profile=profile, **download_opts)
+    seconds = time.perf_counter() - start
+    try:
+        size = os.path.getsize(path)
+    finally:
+        release_job_dir(Path(path).parent)
+    return {
+        'profile': profile if isinstance(profile, str) else str(profile),
+        'bytes': size,
+        'seconds': seconds,
+        'mbps': size / max(seconds, 1e-6) / (1024 * 1024)
+    }
+
+def compare_profiles(url, profiles=None, **download_opts):
+    """
+    依次用多个配置下载同一视频，比较实际速度
     
     Args:
         url: 视频URL
+        profiles: 配置名称或字典列表 (默认: 全部预设配置)
+        **download_opts: 传给 download_video 的其他参数
     
     Returns:
-        视频标题和时长
+        measure_download 结果列表，按速度从快到慢排序
+    """
+    results = [measure_download(url, profile, **download_opts) for profile in profiles or DOWNLOAD_PROFILES]
+    return sorted(results, key=lambda result: result['mbps'], reverse=True)
+
+# 元数据缓存：同一URL在有效期内只提取一次，所有会话和页面重跑共享
+# 视频直链有时效，过期后自动重新提取
+METADATA_TTL = 600
+METADATA_MAX_ENTRIES = 256
+
+@st.cache_data(ttl=METADATA_TTL, max_entries=METADATA_MAX_ENTRIES, show_spinner=False)
+def extract_metadata(url):
+    """
+    提取视频完整元数据（只访问一次网络），结果按URL缓存
+    
+    Args:
+        url: 视频URL
+    
+    Returns:
+        yt-dlp 提取的元数据字典（已处理为可序列化格式）
     """
     try:
-        with yt_dlp.YoutubeDL() as ydl:
+        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
             info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', '未知标题'),
-                'duration': info.get('duration', 0)
-            }
+            return ydl.sanitize_info(info)
     except Exception as e:
         raise Exception(f"获取视频信息时出错: {str(e)}")
 
+def get_video_info(url):
+    """
+    获取视频信息
+    
+    Args:
+        url: 视频URL
+    
+    Returns:
+        视频标题、时长，以及可用时的上传者和播放量
+    """
+    info = extract_metadata(url)
+    video_info = {
+        'title': info.get('title') or '未知标题',
+        'duration': info.get('duration') or 0
+    }
+    for key in ('uploader', 'view_count'):
+        if info.get(key) is not None:
+            video_info[key] = info[key]
+    return video_info
+
 def get_thumbnail(url):
     """
     获取视频缩略图URL
@@ -99,11 +251,11 @@ def get_thumbnail(url):
         缩略图URL或None
     """
     try:
-        with yt_dlp.YoutubeDL() as ydl:
-            info = ydl.extract_info(url, download=False)
-            thumbnails = info.get('thumbnails', [])
-            if thumbnails:
-                # 返回最高质量的缩略图
-                return sorted(thumbnails, key=lambda x: x.get('height', 0))[-1]['url']
+        info = extract_metadata(url)
     except Exception:
-        return None 
\ No newline at end of file
+        return None
+    thumbnails = [t for t in info.get('thumbnails') or [] if t.get('url')]
+    if thumbnails:
+        # 返回最高质量的缩略图
+        return max(thumbnails, key=lambda x: x.get('height') or 0)['url']
+    return info.get('thumbnail')